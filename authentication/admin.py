@@ -1,4 +1,5 @@
 from django.contrib import admin
-from authentication.models import User
+from authentication.models import User, OutgoingEmail
 
 admin.site.register(User)
+admin.site.register(OutgoingEmail)
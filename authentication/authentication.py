@@ -0,0 +1,93 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def user_version_key(user_id):
+    return f'auth:user:version:{user_id}'
+
+
+def user_version_cache():
+    # The shared tier directly: a version bumped on one worker (password
+    # change, logout everywhere, delete) has to be seen by every other worker
+    # on the next request, not after the local tier's LOCAL_TIMEOUT.
+    return caches[getattr(settings, 'AUTH_USER_VERSION_CACHE', 'shared')]
+
+
+def get_user_version(user_id):
+    versions = user_version_cache()
+    key = user_version_key(user_id)
+    version = versions.get(key)
+    if version is None:
+        # Starts from the clock so an evicted version never reuses the
+        # number of a stale entry.
+        versions.add(key, time.time_ns(), timeout=None)
+        version = versions.get(key)
+    return version
+
+
+def bump_user_version(user_id):
+    versions = user_version_cache()
+    key = user_version_key(user_id)
+    try:
+        versions.incr(key)
+    except ValueError:
+        versions.add(key, time.time_ns(), timeout=None)
+
+
+def invalidate_user(user_id):
+    # After commit, so a concurrent request cannot cache the old row under
+    # the new version.
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the resolved user in the cache for
+    AUTH_USER_CACHE_TIMEOUT seconds, keyed by user id and a per-user version
+    that is bumped whenever the user is saved or deleted (see
+    authentication.signals).
+
+    Only cached_fields are stored, never the password hash. Cached users are
+    rebuilt with the other fields deferred, so reading one of them loads it
+    from the database and saving one writes only the loaded fields.
+    """
+
+    # User has no is_active column; AbstractBaseUser.is_active is always True.
+    cached_fields = ('id', 'email', 'is_staff', 'is_superuser', 'is_verified')
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        key = f'auth:user:{user_id}:{get_user_version(user_id)}'
+        cached = cache.get(key)
+        if cached is None:
+            user = super().get_user(validated_token)
+            cache.set(key, {
+                'fields': [getattr(user, name) for name in self.cached_fields],
+                'password_hash': (
+                    get_md5_hash_password(user.password) if api_settings.CHECK_REVOKE_TOKEN else None
+                ),
+            }, timeout=getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+            return user
+
+        user = self.user_model.from_db(DEFAULT_DB_ALIAS, self.cached_fields, cached['fields'])
+        # The same checks JWTAuthentication makes after loading the row.
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != cached['password_hash']:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code='password_changed'
+                )
+        return user
@@ -0,0 +1,160 @@
+import hashlib
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+STAMP_KEY = 'auth:blacklist:stamp'
+GENERATION_KEY = 'auth:blacklist:generation'
+
+
+def blacklist_cache():
+    # The shared tier directly: a token blacklisted on one worker has to be
+    # refused by every other worker on the next request.
+    return caches[getattr(settings, 'TOKEN_BLACKLIST_CACHE', 'shared')]
+
+
+def new_stamp():
+    return os.urandom(8).hex()
+
+
+def publish(key):
+    blacklist_cache().set(key, new_stamp(), timeout=None)
+    # This worker does not wait for its sync interval.
+    blacklist_filter.expire()
+
+
+def mark_blacklist_changed():
+    # A new blacklist entry: filters load the rows added since their last sync.
+    transaction.on_commit(lambda: publish(STAMP_KEY))
+
+
+def mark_blacklist_pruned():
+    # Entries were removed: filters rebuild from scratch to shed them.
+    transaction.on_commit(lambda: publish(GENERATION_KEY))
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+class BlacklistFilter:
+    """
+    Per-process Bloom filter of blacklisted token ids.
+
+    A negative answer is final, so the common "not blacklisted" case needs
+    no join over the blacklist tables. The shared stamps are read at most
+    once per TOKEN_BLACKLIST_SYNC_INTERVAL seconds, so other workers refuse
+    a newly blacklisted token within that interval. The filter syncs when a
+    stamp changes: it loads only the rows added since the last sync, or
+    rebuilds completely after a prune or once it outgrows its capacity.
+    """
+
+    # Rows are read by id, and ids are assigned before commit, so each sync
+    # re-reads this many rows below the watermark to catch inserts that
+    # committed out of order.
+    overlap = 100
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.watermark = 0
+        self.stamp = None
+        self.generation = None
+        self.checked_at = None
+
+    def expire(self):
+        # The next check reads the shared stamps whatever the interval.
+        self.checked_at = None
+
+    def new_bloom(self, rows):
+        capacity = getattr(settings, 'TOKEN_BLACKLIST_FILTER_CAPACITY', 100000)
+        error_rate = getattr(settings, 'TOKEN_BLACKLIST_FILTER_ERROR_RATE', 0.001)
+        return BloomFilter(max(capacity, rows * 2), error_rate)
+
+    def load(self, since=None):
+        rows = BlacklistedToken.objects.order_by('id')
+        if since is not None:
+            rows = rows.filter(id__gt=since)
+        for pk, jti in rows.values_list('id', 'token__jti').iterator(chunk_size=5000):
+            self.bloom.add(jti)
+            if pk > self.watermark:
+                self.bloom.count += 1
+                self.watermark = pk
+
+    def sync(self):
+        now = time.monotonic()
+        interval = getattr(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', 5)
+        if self.checked_at is not None and now - self.checked_at < interval:
+            return
+
+        cache = blacklist_cache()
+        found = cache.get_many([STAMP_KEY, GENERATION_KEY])
+        stamp = found.get(STAMP_KEY)
+        generation = found.get(GENERATION_KEY)
+        if stamp is None:
+            stamp = new_stamp()
+            cache.add(STAMP_KEY, stamp, timeout=None)
+            stamp = cache.get(STAMP_KEY, stamp)
+
+        with self.lock:
+            if self.bloom is not None and (stamp, generation) == (self.stamp, self.generation):
+                self.checked_at = now
+                return
+            rebuild = (
+                self.bloom is None
+                or generation != self.generation
+                or self.bloom.count >= self.bloom.capacity
+            )
+            if rebuild:
+                self.bloom = self.new_bloom(BlacklistedToken.objects.count())
+                self.watermark = 0
+                self.load()
+            else:
+                self.load(since=max(0, self.watermark - self.overlap))
+            self.stamp = stamp
+            self.generation = generation
+            self.checked_at = now
+
+    def might_contain(self, jti):
+        self.sync()
+        return jti in self.bloom
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class RefreshToken(tokens.RefreshToken):
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if not blacklist_filter.might_contain(jti):
+            return
+        if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            raise TokenError(_('Token is blacklisted'))
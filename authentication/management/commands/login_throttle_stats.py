@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from authentication.throttling import get_throttle_metrics
+
+
+class Command(BaseCommand):
+    help = 'Prints how many login attempts each throttle allowed and rejected.'
+
+    def handle(self, *args, **options):
+        for scope, metrics in get_throttle_metrics().items():
+            self.stdout.write(
+                f'{scope}: {metrics["allowed"]} allowed, {metrics["throttled"]} throttled'
+            )
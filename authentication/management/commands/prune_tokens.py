@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from authentication.blacklist import mark_blacklist_pruned
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired outstanding and blacklisted refresh tokens in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help='Seconds to wait between batches.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep pruning every --interval seconds instead of exiting.')
+        parser.add_argument('--interval', type=float, default=3600)
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = self.prune(options['batch_size'], options['pause'])
+            self.stdout.write(f'Pruned {deleted} expired tokens.')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def prune(self, batch_size, pause):
+        deleted = 0
+        now = aware_utcnow()
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by('expires_at', 'id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # Cascades to the batch's BlacklistedToken rows.
+            OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            time.sleep(pause)
+
+        if deleted:
+            mark_blacklist_pruned()
+        return deleted
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from authentication.models import ConfirmationCode
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired confirmation codes in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help='Seconds to wait between batches.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep purging every --interval seconds instead of exiting.')
+        parser.add_argument('--interval', type=float, default=3600)
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = self.purge(options['batch_size'], options['pause'])
+            self.stdout.write(f'Purged {deleted} expired confirmation codes.')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def purge(self, batch_size, pause):
+        deleted = 0
+        now = timezone.now()
+        while True:
+            # Walks confirmation_expires_idx from the oldest expiry.
+            ids = list(
+                ConfirmationCode.objects.filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # Nothing references the codes, so this is a single DELETE.
+            ConfirmationCode.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            time.sleep(pause)
+        return deleted
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from authentication.utils import Util
+
+
+class Command(BaseCommand):
+    help = 'Sends queued emails in batches over a single SMTP connection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the queue instead of exiting when it is empty.')
+        parser.add_argument('--interval', type=float, default=2,
+                            help='Seconds to wait between polls of an empty queue.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = Util.send_queued_emails(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} emails, {failed} failed.')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
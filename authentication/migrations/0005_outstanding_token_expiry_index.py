@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # prune_tokens deletes outstanding tokens by expiry in batches; without
+    # this index every batch scans the whole table. The table belongs to
+    # rest_framework_simplejwt.token_blacklist, so the index is plain SQL.
+
+    dependencies = [
+        ('authentication', '0004_outgoingemail'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX token_blacklist_outstanding_expires_idx '
+            'ON token_blacklist_outstandingtoken (expires_at, id)',
+            'DROP INDEX token_blacklist_outstanding_expires_idx',
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.8 on 2026-10-18 16:00
+
+import authentication.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0005_outstanding_token_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='confirmationcode',
+            name='expires_at',
+            field=models.DateTimeField(default=authentication.models.confirmation_code_expiry),
+        ),
+        migrations.AddIndex(
+            model_name='confirmationcode',
+            index=models.Index(fields=['user', 'code'], name='confirmation_user_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='confirmationcode',
+            index=models.Index(fields=['expires_at'], name='confirmation_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.8 on 2026-10-18 16:49
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0007_outgoingemail_sending_status'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='confirmationcode',
+            name='is_confirmed',
+        ),
+    ]
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
 )
@@ -26,10 +28,20 @@ class User(AbstractBaseUser, PermissionsMixin):
         return f"{self.email}"
 
 
+def confirmation_code_expiry():
+    return timezone.now() + settings.CONFIRMATION_CODE_LIFETIME
+
+
 class ConfirmationCode(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     code = models.CharField(max_length=6)
-    is_confirmed = models.BooleanField(default=False)
+    expires_at = models.DateTimeField(default=confirmation_code_expiry)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'code'], name='confirmation_user_code_idx'),
+            models.Index(fields=['expires_at'], name='confirmation_expires_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.code}"
@@ -39,3 +51,34 @@ class ConfirmationCode(models.Model):
         code_length = 4
         characters = string.digits
         return ''.join(random.choice(characters) for _ in range(code_length))
+
+
+class OutgoingEmail(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    to_email = models.EmailField(max_length=100)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+from authentication.blacklist import RefreshToken
 from authentication.models import User
 
 
@@ -38,8 +40,18 @@ class LoginSerializer(serializers.ModelSerializer):
 
 
 class ConfirmationCodeSerializer(serializers.Serializer):
+    email = serializers.EmailField()
     code = serializers.CharField(max_length=6)
 
 
+class ResendConfirmationCodeSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+
+
 class LogoutSerializer(serializers.Serializer):
     refresh_token = serializers.CharField()
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    # Checks the blacklist through the in-process filter first.
+    token_class = RefreshToken
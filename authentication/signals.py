@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from authentication.authentication import invalidate_user
+from authentication.blacklist import mark_blacklist_changed
+from authentication.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Covers profile edits, verification, deactivation and password changes,
+    # all of which go through User.save().
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def refresh_blacklist_filters(sender, instance, created, **kwargs):
+    if created:
+        mark_blacklist_changed()
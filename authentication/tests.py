@@ -1,3 +1,479 @@
-from django.test import TestCase
+import datetime
+import io
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from authentication.authentication import CachedJWTAuthentication, user_version_key
+from authentication.blacklist import (
+    STAMP_KEY,
+    BlacklistFilter,
+    RefreshToken,
+    blacklist_cache,
+    new_stamp,
+)
+from authentication.models import ConfirmationCode, OutgoingEmail, User
+from authentication.throttling import get_throttle_metrics, throttle_cache
+from authentication.utils import Util
+
+
+def create_user(email='reader@example.com', password='password', **fields):
+    return User.objects.create_user(email=email, password=password, is_verified=True, **fields)
+
+
+class TokenBlacklistTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        # A worker that has not synced yet, for every test.
+        patcher = mock.patch('authentication.blacklist.blacklist_filter', BlacklistFilter())
+        self.filter = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = create_user()
+
+    def refresh(self, token):
+        return self.client.post(reverse('token_refresh'), {'refresh': str(token)})
+
+    def logout(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('logout'),
+                {'refresh_token': str(token)},
+                HTTP_AUTHORIZATION=f'Bearer {token.access_token}',
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_refresh_skips_database_within_sync_interval(self):
+        self.assertEqual(self.refresh(RefreshToken.for_user(self.user)).status_code, 200)
+        token = RefreshToken.for_user(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refresh(token).status_code, 200)
+
+    def test_freshly_blacklisted_token_is_rejected(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        self.logout(token)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(RefreshToken.for_user(self.user)).status_code, 200)
+
+    def test_other_workers_sync_after_interval(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        # Blacklisted by another worker: only the shared stamp changes here.
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        blacklist_cache().set(STAMP_KEY, new_stamp(), timeout=None)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        with override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0):
+            self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_false_positive_falls_through_to_database(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        self.filter.bloom.add(token['jti'])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.refresh(token).status_code, 200)
+
+    def test_prune_tokens(self):
+        expired, blacklisted_expired, blacklisted, active = [
+            RefreshToken.for_user(self.user) for _ in range(4)
+        ]
+        for token in (blacklisted_expired, blacklisted):
+            self.logout(token)
+        OutstandingToken.objects.filter(
+            jti__in=[expired['jti'], blacklisted_expired['jti']],
+        ).update(expires_at=aware_utcnow() - datetime.timedelta(minutes=1))
+        self.assertEqual(self.refresh(active).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('prune_tokens', batch_size=1, pause=0, stdout=io.StringIO())
+        self.assertEqual(
+            set(OutstandingToken.objects.values_list('jti', flat=True)),
+            {blacklisted['jti'], active['jti']},
+        )
+        self.assertEqual(
+            list(BlacklistedToken.objects.values_list('token__jti', flat=True)),
+            [blacklisted['jti']],
+        )
+        # The prune makes this worker rebuild its filter from the rows left.
+        self.assertIsNone(self.filter.checked_at)
+        self.assertEqual(self.refresh(blacklisted).status_code, 401)
+        self.assertEqual(self.refresh(active).status_code, 200)
+        self.assertEqual(self.filter.bloom.count, 1)
+
+
+class ConfirmationCodeTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='reader@example.com', password='password')
+        self.other_user = User.objects.create_user(email='other@example.com', password='password')
+
+    def confirm(self, data):
+        return self.client.post(reverse('email-confirm'), data)
+
+    def test_confirm(self):
+        ConfirmationCode.objects.create(user=self.user, code='1234')
+        # Codes are per user: the same digits of another user do not clash.
+        ConfirmationCode.objects.create(user=self.other_user, code='1234')
+
+        response = self.confirm({'email': 'Reader@Example.com', 'code': '1234'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.other_user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+        self.assertFalse(self.other_user.is_verified)
+        self.assertFalse(ConfirmationCode.objects.filter(user=self.user).exists())
+        self.assertTrue(ConfirmationCode.objects.filter(user=self.other_user).exists())
+
+        # Used codes are gone.
+        self.assertEqual(self.confirm({'email': 'reader@example.com', 'code': '1234'}).status_code, 400)
+
+    def test_code_of_another_user(self):
+        ConfirmationCode.objects.create(user=self.other_user, code='5678')
+        response = self.confirm({'email': 'reader@example.com', 'code': '5678'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(is_verified=True).exists())
+
+    def test_expired_code(self):
+        ConfirmationCode.objects.create(
+            user=self.user, code='1234', expires_at=timezone.now() - datetime.timedelta(seconds=1),
+        )
+        response = self.confirm({'email': 'reader@example.com', 'code': '1234'})
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_verified)
+
+    def test_missing_email(self):
+        ConfirmationCode.objects.create(user=self.user, code='1234')
+        response = self.confirm({'code': '1234'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json())
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_verified)
+
+    def resend(self, email='reader@example.com'):
+        return self.client.post(reverse('email-confirm-resend'), {'email': email})
+
+    def test_reissue_expired_code(self):
+        ConfirmationCode.objects.create(
+            user=self.user, code='1234', expires_at=timezone.now() - datetime.timedelta(seconds=1),
+        )
+        self.assertEqual(self.confirm({'email': 'reader@example.com', 'code': '1234'}).status_code, 400)
+
+        response = self.resend('Reader@Example.com')
+        self.assertEqual(response.status_code, 200)
+        code = ConfirmationCode.objects.get(user=self.user)
+        self.assertGreater(code.expires_at, timezone.now())
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.to_email, 'reader@example.com')
+        self.assertIn(code.code, email.body)
+
+        self.assertEqual(self.confirm({'email': 'reader@example.com', 'code': code.code}).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+
+    def test_resend_replaces_previous_code(self):
+        ConfirmationCode.objects.create(user=self.user, code='1234')
+        with mock.patch.object(ConfirmationCode, 'generate_code', return_value='5678'):
+            self.assertEqual(self.resend().status_code, 200)
+        self.assertEqual(list(ConfirmationCode.objects.values_list('code', flat=True)), ['5678'])
+        self.assertEqual(self.confirm({'email': 'reader@example.com', 'code': '1234'}).status_code, 400)
+
+    def test_resend_refused(self):
+        self.assertEqual(self.resend('nobody@example.com').status_code, 404)
+        User.objects.filter(pk=self.user.pk).update(is_verified=True)
+        self.assertEqual(self.resend().status_code, 400)
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    @override_settings(REST_FRAMEWORK={
+        'DEFAULT_AUTHENTICATION_CLASSES': ['authentication.authentication.CachedJWTAuthentication'],
+        'DEFAULT_THROTTLE_RATES': {'confirmation_resend': '2/hour'},
+    })
+    def test_resend_is_throttled(self):
+        caches['shared'].clear()
+        self.addCleanup(caches['shared'].clear)
+        for _ in range(2):
+            self.assertEqual(self.resend().status_code, 200)
+        with self.assertLogs('authentication.throttling', 'WARNING'):
+            self.assertEqual(self.resend().status_code, 429)
+        self.assertEqual(OutgoingEmail.objects.count(), 2)
+
+    def test_purge_confirmation_codes(self):
+        now = timezone.now()
+        ConfirmationCode.objects.bulk_create([
+            ConfirmationCode(user=self.user, code=f'{i:04d}', expires_at=now - datetime.timedelta(hours=i))
+            for i in range(1, 6)
+        ])
+        live = ConfirmationCode.objects.create(user=self.other_user, code='1234')
+
+        out = io.StringIO()
+        call_command('purge_confirmation_codes', batch_size=2, pause=0, stdout=out)
+        self.assertIn('Purged 5 expired confirmation codes.', out.getvalue())
+        self.assertEqual(list(ConfirmationCode.objects.all()), [live])
+
+
+LOCMEM_EMAIL = override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_QUEUE_MAX_ATTEMPTS=3,
+    EMAIL_QUEUE_RETRY_DELAY=30,
+    EMAIL_QUEUE_LEASE=600,
+)
+SEND_MESSAGES = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+
+
+def queue_emails(count):
+    return [
+        Util.queue_email({
+            'email_subject': 'Confirm your email',
+            'email_body': f'Your code is {i:04d}',
+            'to_email': f'reader{i}@example.com',
+        })
+        for i in range(count)
+    ]
+
+
+@LOCMEM_EMAIL
+class QueuedEmailTests(TestCase):
+
+    def assertDueIn(self, message, seconds):
+        expected = timezone.now() + datetime.timedelta(seconds=seconds)
+        self.assertAlmostEqual(message.next_attempt_at, expected, delta=datetime.timedelta(seconds=5))
+
+    def make_due(self):
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+
+    def test_send(self):
+        queue_emails(3)
+        self.assertEqual(Util.send_queued_emails(batch_size=2), (2, 0))
+        self.assertEqual(Util.send_queued_emails(batch_size=2), (1, 0))
+        self.assertEqual(Util.send_queued_emails(batch_size=2), (0, 0))
+
+        self.assertEqual(
+            sorted(message.to for message in mail.outbox),
+            [['reader0@example.com'], ['reader1@example.com'], ['reader2@example.com']],
+        )
+        for message in OutgoingEmail.objects.all():
+            self.assertEqual((message.status, message.attempts), (OutgoingEmail.STATUS_SENT, 1))
+            self.assertIsNotNone(message.sent_at)
+
+    def test_retry_with_backoff(self):
+        message, = queue_emails(1)
+        with mock.patch(SEND_MESSAGES, side_effect=ConnectionError('SMTP down')):
+            self.assertEqual(Util.send_queued_emails(), (0, 1))
+            message.refresh_from_db()
+            self.assertEqual((message.status, message.attempts), (OutgoingEmail.STATUS_PENDING, 1))
+            self.assertEqual(message.last_error, 'ConnectionError: SMTP down')
+            self.assertDueIn(message, 30)
+            # Not due yet.
+            self.assertEqual(Util.send_queued_emails(), (0, 0))
+
+            self.make_due()
+            self.assertEqual(Util.send_queued_emails(), (0, 1))
+            message.refresh_from_db()
+            self.assertEqual(message.attempts, 2)
+            self.assertDueIn(message, 60)
+
+        self.make_due()
+        self.assertEqual(Util.send_queued_emails(), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutgoingEmail.STATUS_SENT, 3))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        message, = queue_emails(1)
+        with mock.patch(SEND_MESSAGES, side_effect=ConnectionError('SMTP down')):
+            for _ in range(3):
+                self.make_due()
+                Util.send_queued_emails()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutgoingEmail.STATUS_FAILED, 3))
+        self.make_due()
+        self.assertEqual(Util.send_queued_emails(), (0, 0))
+
+    def test_claimed_messages_are_leased(self):
+        queue_emails(2)
+        claimed = Util.claim_queued_emails()
+        self.assertEqual(len(claimed), 2)
+        for message in OutgoingEmail.objects.all():
+            self.assertEqual(message.status, OutgoingEmail.STATUS_SENDING)
+            self.assertDueIn(message, 600)
+        # Other workers skip them while the lease holds.
+        self.assertEqual(Util.claim_queued_emails(), [])
+
+        # The worker died: the messages are sent once the lease runs out.
+        self.make_due()
+        self.assertEqual(Util.send_queued_emails(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+
+@LOCMEM_EMAIL
+class QueuedEmailTransactionTests(TransactionTestCase):
+
+    def test_sends_outside_transaction(self):
+        queue_emails(2)
+        in_atomic_block = []
+
+        def send_messages(messages):
+            in_atomic_block.append(connection.in_atomic_block)
+            return len(messages)
+
+        with mock.patch(SEND_MESSAGES, side_effect=send_messages):
+            self.assertEqual(Util.send_queued_emails(), (2, 0))
+        self.assertEqual(in_atomic_block, [False, False])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = create_user(first_name='Reader')
+        self.token = RefreshToken.for_user(self.user).access_token
+
+    def authenticate(self):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_cached_user(self):
+        self.assertEqual(self.authenticate(), self.user)
+        # Only the version lookup, which the test settings keep in the
+        # database cache table.
+        with self.assertNumQueries(1):
+            user = self.authenticate()
+        self.assertEqual((user.pk, user.email, user.is_verified), (self.user.pk, self.user.email, True))
+        self.assertFalse(user.is_staff)
+        self.assertTrue(user.is_authenticated)
+        # Everything else, the password hash included, is loaded on access.
+        self.assertEqual(user.get_deferred_fields(), {
+            field.attname for field in type(user)._meta.concrete_fields
+        } - set(CachedJWTAuthentication.cached_fields))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.first_name, 'Reader')
+
+    def test_password_hash_is_not_cached(self):
+        with mock.patch('authentication.authentication.cache', mock.Mock(wraps=cache)) as wrapped:
+            self.authenticate()
+        (key, value), _ = wrapped.set.call_args
+        self.assertTrue(key.startswith(f'auth:user:{self.user.pk}:'))
+        self.assertNotIn(self.user.password, repr(value))
+
+    def test_save_invalidates(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = True
+            self.user.save()
+        self.assertTrue(self.authenticate().is_staff)
+        with self.assertNumQueries(1):
+            self.assertTrue(self.authenticate().is_staff)
+
+    def test_version_bumped_elsewhere_applies_at_once(self):
+        self.authenticate()
+        # Another worker changes the row and bumps the version; this worker's
+        # local tier must not keep serving the old user.
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        caches['shared'].incr(user_version_key(self.user.pk))
+        self.assertTrue(self.authenticate().is_staff)
+
+    def test_inactive_user_is_refused(self):
+        self.authenticate()
+        with mock.patch.object(type(self.user), 'is_active', False):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate()
+
+    def test_delete_invalidates(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class UnavailableCaches:
+    # Stands in for django.core.cache.caches while the shared store is down.
+    def __getitem__(self, alias):
+        return mock.Mock(**{
+            f'{method}.side_effect': ConnectionError('Cache unavailable')
+            for method in ('get', 'set', 'get_many', 'incr', 'add')
+        })
+
+
+IP_LIMIT_SETTINGS = {
+    'DEFAULT_AUTHENTICATION_CLASSES': ['authentication.authentication.CachedJWTAuthentication'],
+    'DEFAULT_THROTTLE_RATES': {'login_ip': '3/min', 'login_account': '100/min'},
+    'NUM_PROXIES': 0,
+}
+
+
+class LoginThrottleTests(TestCase):
+
+    def setUp(self):
+        throttle_cache.local.clear()
+        self.addCleanup(throttle_cache.local.clear)
+        create_user()
+
+    def login(self, password='password', email='reader@example.com', ip='10.0.0.1', **headers):
+        return self.client.post(
+            reverse('token_obtain_pair'), {'email': email, 'password': password}, REMOTE_ADDR=ip, **headers,
+        )
+
+    def test_account_limit(self):
+        # From different addresses, so only the per-account limit applies.
+        for attempt in range(5):
+            self.assertEqual(self.login('wrong', ip=f'10.0.0.{attempt}').status_code, 401)
+        with self.assertLogs('authentication.throttling', 'WARNING'):
+            self.assertEqual(self.login(ip='10.0.1.1').status_code, 429)
+            self.assertEqual(self.login(email='READER@example.com ', ip='10.0.1.2').status_code, 429)
+        # Other accounts are not affected.
+        self.assertEqual(self.login(email='other@example.com', ip='10.0.1.3').status_code, 404)
+
+        self.assertEqual(get_throttle_metrics()['login_account'], {'allowed': 6, 'throttled': 2})
+
+    @override_settings(REST_FRAMEWORK=IP_LIMIT_SETTINGS)
+    def test_ip_limit(self):
+        for attempt in range(3):
+            self.assertEqual(self.login(email=f'user{attempt}@example.com').status_code, 404)
+        with self.assertLogs('authentication.throttling', 'WARNING'):
+            self.assertEqual(self.login().status_code, 429)
+        self.assertEqual(self.login(ip='10.0.0.2').status_code, 200)
+
+    @override_settings(REST_FRAMEWORK=IP_LIMIT_SETTINGS)
+    def test_ip_limit_ignores_forwarded_for(self):
+        for attempt in range(3):
+            response = self.login(email=f'user{attempt}@example.com', HTTP_X_FORWARDED_FOR=f'192.0.2.{attempt}')
+            self.assertEqual(response.status_code, 404)
+        with self.assertLogs('authentication.throttling', 'WARNING'):
+            self.assertEqual(self.login(HTTP_X_FORWARDED_FOR='192.0.2.100').status_code, 429)
+
+    @override_settings(REST_FRAMEWORK={**IP_LIMIT_SETTINGS, 'NUM_PROXIES': 1})
+    def test_ip_limit_behind_proxy(self):
+        # The proxy appends the address it saw; what the client sent before
+        # it does not matter.
+        for attempt in range(3):
+            self.login(email=f'user{attempt}@example.com', HTTP_X_FORWARDED_FOR=f'192.0.2.{attempt}, 198.51.100.1')
+        with self.assertLogs('authentication.throttling', 'WARNING'):
+            self.assertEqual(self.login(HTTP_X_FORWARDED_FOR='192.0.2.100, 198.51.100.1').status_code, 429)
+        self.assertEqual(self.login(HTTP_X_FORWARDED_FOR='198.51.100.2').status_code, 200)
+
+    def test_fails_open_to_local_memory(self):
+        with mock.patch('authentication.throttling.caches', UnavailableCaches()), \
+                self.assertLogs('authentication.throttling', 'WARNING') as logs:
+            response = self.login()
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('access', response.json())
+            self.assertTrue(throttle_cache.degraded)
+            # The limits still hold per worker.
+            for _ in range(4):
+                self.login('wrong')
+            self.assertEqual(self.login().status_code, 429)
+        self.assertIn("Login throttle cache 'shared' unavailable", logs.output[0])
+
+        self.assertEqual(self.login(ip='10.0.0.2').status_code, 200)
+        self.assertFalse(throttle_cache.degraded)
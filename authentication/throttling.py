@@ -0,0 +1,127 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+METRIC_EVENTS = ('allowed', 'throttled')
+
+
+class FallbackCache:
+    # Uses the shared cache alias named by LOGIN_THROTTLE_CACHE and falls
+    # back to process memory while it is unreachable, so an outage of the
+    # shared store weakens the limits to per worker instead of disabling
+    # them or failing logins.
+    local = LocMemCache('login-throttle', {'OPTIONS': {'MAX_ENTRIES': 10000}})
+    degraded = False
+
+    def call(self, method, *args, **kwargs):
+        alias = getattr(settings, 'LOGIN_THROTTLE_CACHE', 'shared')
+        try:
+            result = getattr(caches[alias], method)(*args, **kwargs)
+        except ValueError:
+            # incr() of a missing key.
+            raise
+        except Exception as e:
+            if not self.degraded:
+                logger.warning('Login throttle cache %r unavailable, using local memory: %s', alias, e)
+                self.degraded = True
+            return getattr(self.local, method)(*args, **kwargs)
+        self.degraded = False
+        return result
+
+    def get(self, key, default=None):
+        return self.call('get', key, default)
+
+    def set(self, key, value, timeout):
+        return self.call('set', key, value, timeout)
+
+    def get_many(self, keys):
+        return self.call('get_many', keys)
+
+    def incr(self, key):
+        try:
+            return self.call('incr', key)
+        except ValueError:
+            if self.call('add', key, 1, None):
+                return 1
+            return self.call('incr', key)
+
+
+throttle_cache = FallbackCache()
+
+
+def metric_key(scope, event):
+    return f'login_throttle:metrics:{scope}:{event}'
+
+
+def record_metric(scope, event):
+    throttle_cache.incr(metric_key(scope, event))
+
+
+def get_throttle_metrics():
+    scopes = [throttle.scope for throttle in (LoginIPThrottle, LoginAccountThrottle)]
+    keys = {metric_key(scope, event): (scope, event) for scope in scopes for event in METRIC_EVENTS}
+    values = throttle_cache.get_many(list(keys))
+    metrics = {scope: dict.fromkeys(METRIC_EVENTS, 0) for scope in scopes}
+    for key, (scope, event) in keys.items():
+        metrics[scope][event] = values.get(key, 0)
+    return metrics
+
+
+class LoginRateThrottle(SimpleRateThrottle):
+    # Sliding window of attempt timestamps. Runs in APIView.initial(), i.e.
+    # before LoginView reaches the password hash.
+    cache = throttle_cache
+    cache_format = 'login_throttle:%(scope)s:%(ident)s'
+
+    @property
+    def THROTTLE_RATES(self):
+        # Read on every instantiation so rate changes in settings apply.
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+    def allow_request(self, request, view):
+        allowed = super().allow_request(request, view)
+        if self.rate is not None and self.key is not None:
+            record_metric(self.scope, 'allowed' if allowed else 'throttled')
+        return allowed
+
+    def throttle_failure(self):
+        logger.warning('Attempt throttled by %s.', self.scope)
+        return False
+
+
+class LoginIPThrottle(LoginRateThrottle):
+    # get_ident() trusts X-Forwarded-For only as far as the NUM_PROXIES
+    # setting allows, so clients cannot pick their own address.
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request),
+        }
+
+
+class LoginAccountThrottle(LoginRateThrottle):
+    # Limits guesses against one account however many addresses they come
+    # from. Keyed by a hash of the submitted email, so unknown accounts are
+    # limited the same way.
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class ConfirmationResendThrottle(LoginAccountThrottle):
+    # Each resend queues an email, so they are limited per address.
+    scope = 'confirmation_resend'
@@ -2,6 +2,7 @@ from django.urls import path
 from authentication.views import (
     UserRegisterView,
     ConfirmCodeView,
+    ResendConfirmationCodeView,
     LoginView,
     LogoutView,
     TokenRefreshView,
@@ -13,5 +14,6 @@ urlpatterns = [
     path('login/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('register/', UserRegisterView.as_view(), name='user-registration'),
     path('email-confirm/', ConfirmCodeView.as_view(), name='email-confirm'),
+    path('email-confirm/resend/', ResendConfirmationCodeView.as_view(), name='email-confirm-resend'),
     path('logout/', LogoutView.as_view(), name='logout'),
 ]
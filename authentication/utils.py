@@ -1,4 +1,10 @@
-from django.core.mail import EmailMessage
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from authentication.models import OutgoingEmail
 
 
 class Util:
@@ -11,3 +17,88 @@ class Util:
             to=[data["to_email"]],
         )
         email.send()
+
+    @staticmethod
+    def queue_email(data):
+        return OutgoingEmail.objects.create(
+            subject=data["email_subject"],
+            body=data["email_body"],
+            to_email=data["to_email"],
+        )
+
+    @staticmethod
+    def retry_delay(attempts):
+        base = getattr(settings, 'EMAIL_QUEUE_RETRY_DELAY', 30)
+        return datetime.timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+    @staticmethod
+    def claim_queued_emails(batch_size=100):
+        # A short transaction: the rows are leased to this worker and the
+        # locks released before any SMTP traffic. Sending rows whose lease
+        # ran out belonged to a worker that died and are claimed again.
+        now = timezone.now()
+        lease = datetime.timedelta(seconds=getattr(settings, 'EMAIL_QUEUE_LEASE', 600))
+        with transaction.atomic():
+            # skip_locked lets several workers drain the queue concurrently.
+            messages = list(
+                OutgoingEmail.objects.select_for_update(skip_locked=True).filter(
+                    status__in=[OutgoingEmail.STATUS_PENDING, OutgoingEmail.STATUS_SENDING],
+                    next_attempt_at__lte=now,
+                ).order_by('next_attempt_at')[:batch_size]
+            )
+            for message in messages:
+                message.status = OutgoingEmail.STATUS_SENDING
+                message.next_attempt_at = now + lease
+                message.attempts += 1
+            OutgoingEmail.objects.bulk_update(messages, ['status', 'next_attempt_at', 'attempts'])
+        return messages
+
+    @staticmethod
+    def send_queued_emails(batch_size=100):
+        max_attempts = getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+        messages = Util.claim_queued_emails(batch_size)
+        if not messages:
+            return 0, 0
+
+        sent = 0
+        handled = set()
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+            for message in messages:
+                try:
+                    connection.send_messages([EmailMessage(
+                        subject=message.subject,
+                        body=message.body,
+                        to=[message.to_email],
+                    )])
+                except Exception as e:
+                    Util._mark_failed(message, e, max_attempts)
+                else:
+                    message.status = OutgoingEmail.STATUS_SENT
+                    message.sent_at = timezone.now()
+                    sent += 1
+                handled.add(message.pk)
+        except Exception as e:
+            # The connection itself failed: retry everything not sent.
+            for message in messages:
+                if message.pk not in handled:
+                    Util._mark_failed(message, e, max_attempts)
+        finally:
+            connection.close()
+
+        OutgoingEmail.objects.bulk_update(
+            messages,
+            ['status', 'next_attempt_at', 'last_error', 'sent_at'],
+        )
+        return sent, len(messages) - sent
+
+    @staticmethod
+    def _mark_failed(message, error, max_attempts):
+        # attempts was already counted when the message was claimed.
+        message.last_error = f'{type(error).__name__}: {error}'
+        if message.attempts >= max_attempts:
+            message.status = OutgoingEmail.STATUS_FAILED
+        else:
+            message.status = OutgoingEmail.STATUS_PENDING
+            message.next_attempt_at = timezone.now() + Util.retry_delay(message.attempts)
@@ -1,8 +1,9 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import status, generics
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework_simplejwt.views import (
     TokenRefreshView,
@@ -10,14 +11,30 @@ from rest_framework_simplejwt.views import (
 from authentication.serializers import (
     UserRegisterSerializer,
     ConfirmationCodeSerializer,
+    ResendConfirmationCodeSerializer,
     LoginSerializer,
     LogoutSerializer,
+    TokenRefreshSerializer,
 )
+from authentication.blacklist import RefreshToken
 from authentication.models import User, ConfirmationCode
+from authentication.throttling import ConfirmationResendThrottle, LoginAccountThrottle, LoginIPThrottle
 from authentication.utils import Util
 
 
+def send_confirmation_code(user):
+    confirmation_code = ConfirmationCode.generate_code()
+    ConfirmationCode.objects.create(user=user, code=confirmation_code)
+    Util.queue_email({
+        "email_body": f'Your confirmation code: {confirmation_code}',
+        "to_email": user.email,
+        "email_subject": 'Confirmation Code',
+    })
+
+
 class TokenRefreshView(TokenRefreshView):
+    serializer_class = TokenRefreshSerializer
+
     @swagger_auto_schema(
         tags=['Authentication'],
     )
@@ -42,20 +59,12 @@ class UserRegisterView(generics.CreateAPIView):
         email = request.data.get('email').lower()
         password = request.data.get('password')
 
-        user = User.objects.create_user(
-            email=email,
-            password=password,
-        )
-        confirmation_code = ConfirmationCode.generate_code()
-        ConfirmationCode.objects.create(user=user, code=confirmation_code)
-
-        data = {
-            "email_body": f'Your confirmation code: {confirmation_code}',
-            "to_email": email,
-            "email_subject": 'Confirmation Code',
-        }
-
-        Util.send_email(data)
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email=email,
+                password=password,
+            )
+            send_confirmation_code(user)
         response_data = {
             "message": "User successfully registered. Confirmation code sent to your email.",
         }
@@ -67,28 +76,67 @@ class ConfirmCodeView(generics.GenericAPIView):
 
     @swagger_auto_schema(
         tags=['Authentication'],
+        operation_description='Подтверждает email пользователя. Код проверяется вместе с email, '
+                              'на который он был отправлен; без email запрос отклоняется с кодом 400.',
     )
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        email = serializer.validated_data.get('email').lower()
         code = serializer.validated_data.get('code')
-        try:
-            confirmation_code = ConfirmationCode.objects.get(code=code)
-        except ConfirmationCode.DoesNotExist:
-            return Response({"error": "Invalid or already confirmed code."}, status=400)
+        # Served by the unique email index and confirmation_user_code_idx.
+        confirmation_code = ConfirmationCode.objects.filter(
+            user__email=email,
+            code=code,
+            expires_at__gt=timezone.now(),
+        ).select_related('user').first()
+        if confirmation_code is None:
+            return Response({"error": "Invalid, expired or already confirmed code."}, status=400)
 
         user = confirmation_code.user
-        user.is_verified = True
-        user.save()
-        confirmation_code.delete()
+        with transaction.atomic():
+            user.is_verified = True
+            user.save()
+            ConfirmationCode.objects.filter(user=user).delete()
         return Response({
             "message": "You successfully verified your account!",
         }, status=200)
 
 
+class ResendConfirmationCodeView(generics.GenericAPIView):
+    serializer_class = ResendConfirmationCodeSerializer
+    throttle_classes = [ConfirmationResendThrottle]
+
+    @swagger_auto_schema(
+        tags=['Authentication'],
+        operation_description='Отправляет новый код подтверждения на email неподтверждённого '
+                              'пользователя, например после истечения срока действия старого. '
+                              'Предыдущие коды перестают действовать.',
+    )
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        email = serializer.validated_data['email'].lower()
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            return Response({"error": "User not found!"}, status=status.HTTP_404_NOT_FOUND)
+        if user.is_verified:
+            return Response({"error": "Email is already verified."}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # Previous codes, expired or not, stop working.
+            ConfirmationCode.objects.filter(user=user).delete()
+            send_confirmation_code(user)
+        return Response({
+            "message": "A new confirmation code was sent to your email.",
+        }, status=status.HTTP_200_OK)
+
+
 class LoginView(generics.GenericAPIView):
     serializer_class = LoginSerializer
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
 
     @swagger_auto_schema(
         tags=['Authentication'],
@@ -0,0 +1,181 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from authentication.authentication import CachedJWTAuthentication
+from book.cache import (
+    ALL_BOOKS,
+    CATALOG,
+    book_namespace,
+    response_cache_key,
+    response_cache_timeout,
+)
+from book.filters import BookFilter, BookOrderingFilter
+from book.models import Book, FavoriteBook, Review
+from book.pagination import CustomPagination
+from book.serializers import BookDetailSerializer, BookListSerializer
+from book.views import BookListView
+
+# Async counterparts of BookListView, BookDetailView and FavoritesBookListView
+# for ASGI deployments (see docker-compose.asgi.yml). They use the async ORM
+# so a worker keeps serving other requests while queries run, and return the
+# same JSON as the sync views. DRF 3.14 has no async views, so these are plain
+# Django views reusing the DRF filter, pagination and serializer classes.
+
+
+def error_response(exc):
+    detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    response = JsonResponse(detail, status=exc.status_code, safe=False)
+    if response.status_code == 401:
+        response['WWW-Authenticate'] = CachedJWTAuthentication().authenticate_header(None)
+    return response
+
+
+class AsyncBookView(View):
+    pagination_class = CustomPagination
+
+    async def authenticate(self, request):
+        # Same JWT authentication as the DRF views; the token check and the
+        # cached user lookup are synchronous.
+        result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+        return result[0] if result else None
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            self.user = await self.authenticate(request)
+        except APIException as exc:
+            return error_response(exc)
+        self.drf_request = Request(request)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def cached(self, request, prefix, namespaces, build):
+        key = await sync_to_async(response_cache_key)(prefix, namespaces, request)
+        data = await cache.aget(key)
+        if data is None:
+            data = await build()
+            if isinstance(data, JsonResponse):
+                return data
+            await cache.aset(key, data, timeout=response_cache_timeout())
+        return data
+
+    async def add_favorite_flags(self, items):
+        # The async twin of BookSerializer.with_favorite_flags.
+        if self.user is None:
+            return items
+        favorited = {
+            book_id async for book_id in FavoriteBook.objects.filter(
+                user=self.user,
+                book_id__in=[item['id'] for item in items],
+            ).values_list('book_id', flat=True).aiterator()
+        }
+        return [{**item, 'is_favorited': item['id'] in favorited} for item in items]
+
+    async def paginate(self, request, queryset, serializer_class):
+        # CustomPagination's page number and cursor modes, with the same
+        # response bodies.
+        pagination = self.pagination_class()
+        if request.GET.get(pagination.mode_query_param) == 'cursor':
+            return await self.paginate_keyset(pagination, queryset, serializer_class)
+        page_size = pagination.get_page_size(self.drf_request)
+        try:
+            page = int(request.GET.get(pagination.page_query_param) or 1)
+        except ValueError:
+            page = 0
+        count = await queryset.acount()
+        pages = max(1, math.ceil(count / page_size))
+        if not 1 <= page <= pages:
+            return JsonResponse({'detail': 'Invalid page.'}, status=404)
+
+        offset = (page - 1) * page_size
+        items = [obj async for obj in queryset[offset:offset + page_size].aiterator()]
+        url = request.build_absolute_uri()
+        previous = None
+        if page > 1:
+            previous = (
+                remove_query_param(url, pagination.page_query_param) if page == 2
+                else replace_query_param(url, pagination.page_query_param, page - 1)
+            )
+        return {
+            'page': page,
+            'count': count,
+            'next': replace_query_param(url, pagination.page_query_param, page + 1) if page < pages else None,
+            'previous': previous,
+            'results': serializer_class(items, many=True, context={'request': self.drf_request}).data,
+        }
+
+
+    async def paginate_keyset(self, pagination, queryset, serializer_class):
+        # One indexed query per page; KeysetPagination itself is synchronous.
+        keyset = pagination.keyset_class()
+        keyset.page_size = pagination.page_size
+        try:
+            items = await sync_to_async(keyset.paginate_queryset)(queryset, self.drf_request)
+        except APIException as exc:
+            return error_response(exc)
+        data = serializer_class(items, many=True, context={'request': self.drf_request}).data
+        return keyset.get_paginated_response(data).data
+
+
+class AsyncBookListView(AsyncBookView):
+
+    async def get(self, request):
+        data = await self.cached(request, 'list', [CATALOG], lambda: self.build(request))
+        if isinstance(data, JsonResponse):
+            return data
+        return JsonResponse({**data, 'results': await self.add_favorite_flags(data['results'])})
+
+    async def build(self, request):
+        filterset = BookFilter(request.GET, queryset=BookListView.queryset.all())
+        if not filterset.is_valid():
+            return JsonResponse(filterset.errors, status=400)
+        view = BookListView()
+        ordering = BookOrderingFilter().get_ordering(self.drf_request, filterset.qs, view)
+        queryset = BookListSerializer.rows(filterset.qs.order_by(*ordering))
+        return await self.paginate(request, queryset, BookListSerializer)
+
+
+class AsyncBookDetailView(AsyncBookView):
+
+    async def get(self, request, pk):
+        data = await self.cached(
+            request, 'detail', [book_namespace(pk), ALL_BOOKS], lambda: self.build(pk),
+        )
+        if isinstance(data, JsonResponse):
+            return data
+        return JsonResponse((await self.add_favorite_flags([data]))[0])
+
+    async def build(self, pk):
+        try:
+            book = await Book.objects.select_related('genre', 'author').aget(pk=pk)
+        except Book.DoesNotExist:
+            return JsonResponse({'detail': 'Not found.'}, status=404)
+        # aiterator() does not run prefetches, so the newest reviews are
+        # loaded with their own query, like BookDetailView's Prefetch.
+        limit = BookDetailSerializer.reviews_limit + 1
+        book.latest_reviews = [
+            review async for review in Review.objects.filter(book_id=pk)
+            .select_related('user').order_by('-id')[:limit].aiterator()
+        ]
+        return BookDetailSerializer(book, context={'request': self.drf_request}).data
+
+
+class AsyncFavoritesBookListView(AsyncBookView):
+
+    async def get(self, request):
+        if self.user is None:
+            return error_response(NotAuthenticated())
+        queryset = BookListSerializer.rows(Book.objects.filter(favourites=self.user).order_by('id'))
+        data = await self.paginate(request, queryset, BookListSerializer)
+        if isinstance(data, JsonResponse):
+            return data
+        # Every book of this list is a favourite.
+        return JsonResponse({
+            **data,
+            'results': [{**item, 'is_favorited': True} for item in data['results']],
+        })
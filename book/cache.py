@@ -0,0 +1,107 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+# Version namespaces. Cache keys embed the current version of every
+# namespace they depend on, so bumping a version makes all dependent
+# entries unreachable at once and they simply expire.
+CATALOG = 'catalog'  # every list page
+ALL_BOOKS = 'books'  # every detail page
+
+
+def book_namespace(book_id):
+    return f'book:{book_id}'
+
+
+def version_key(namespace):
+    return f'book:version:{namespace}'
+
+
+def get_versions(namespaces):
+    keys = [version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Versions start from the clock rather than 1, so a version key
+            # that was evicted can never reuse the numbers of stale entries.
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(namespaces):
+    for namespace in namespaces:
+        key = version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def invalidate(*namespaces):
+    # Bumping before commit would let a concurrent request cache the old
+    # rows under the new version.
+    namespaces = list(namespaces)
+    transaction.on_commit(lambda: bump_versions(namespaces))
+
+
+def invalidate_catalog():
+    invalidate(CATALOG, ALL_BOOKS)
+
+
+def response_cache_key(prefix, namespaces, request):
+    versions = get_versions(namespaces)
+    query = urlencode(sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        for value in values
+        if value
+    ))
+    digest = hashlib.md5(
+        f'{request.get_host()}{request.path}?{query}'.encode()
+    ).hexdigest()
+    return 'book:response:{}:{}:{}'.format(
+        prefix,
+        '.'.join(str(version) for version in versions),
+        digest,
+    )
+
+
+def response_cache_timeout():
+    return getattr(settings, 'BOOK_RESPONSE_CACHE_TIMEOUT', 300)
+
+
+class VersionedCacheMixin:
+    cache_prefix = None
+
+    def get_cache_namespaces(self):
+        raise NotImplementedError
+
+    def get_cache_key(self, request):
+        return response_cache_key(self.cache_prefix, self.get_cache_namespaces(), request)
+
+    def get_cached_response(self, request, build_response):
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = build_response()
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=response_cache_timeout())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, lambda: super(VersionedCacheMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, lambda: super(VersionedCacheMixin, self).retrieve(request, *args, **kwargs),
+        )
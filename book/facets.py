@@ -0,0 +1,65 @@
+from django.db.models import Count
+
+from book.models import Author, BookFacetCount, Genre
+
+FACET_NAMES = {
+    BookFacetCount.GENRE: 'genres',
+    BookFacetCount.AUTHOR: 'authors',
+    BookFacetCount.YEAR: 'years',
+}
+
+
+def is_filtered(filterset):
+    return any(value not in (None, '') for value in filterset.form.cleaned_data.values())
+
+
+def summary_counts(limit):
+    # The common, unfiltered case reads the maintained summary table and
+    # never touches book_book.
+    return {
+        dimension: list(
+            BookFacetCount.objects.filter(dimension=dimension, count__gt=0)
+            .order_by('-count', 'key')
+            .values_list('key', 'count')[:limit]
+        )
+        for dimension in FACET_NAMES
+    }
+
+
+def filtered_counts(queryset, limit):
+    queryset = queryset.order_by()
+    return {
+        dimension: list(
+            queryset.values(key=expression)
+            .annotate(count=Count('id'))
+            .order_by('-count', 'key')
+            .values_list('key', 'count')[:limit]
+        )
+        for dimension, expression in BookFacetCount.key_expressions().items()
+    }
+
+
+def get_facets(filterset, limit):
+    # Counts for the books matching the BookFilter selection, at most limit
+    # entries per dimension, largest first.
+    if is_filtered(filterset):
+        counts = filtered_counts(filterset.qs, limit)
+    else:
+        counts = summary_counts(limit)
+
+    names = {}
+    for dimension, model in ((BookFacetCount.GENRE, Genre), (BookFacetCount.AUTHOR, Author)):
+        ids = [key for key, _ in counts[dimension]]
+        names[dimension] = dict(model.objects.filter(id__in=ids).values_list('id', 'name')) if ids else {}
+
+    facets = {
+        FACET_NAMES[dimension]: [
+            {'id': key, 'name': names[dimension].get(key), 'count': count}
+            for key, count in counts[dimension]
+        ]
+        for dimension in names
+    }
+    facets[FACET_NAMES[BookFacetCount.YEAR]] = [
+        {'year': key, 'count': count} for key, count in counts[BookFacetCount.YEAR]
+    ]
+    return facets
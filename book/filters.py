@@ -1,5 +1,7 @@
 import django_filters
-from book.models import Book
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import OrderingFilter
+from book.models import Book, Review
 
 
 class BookFilter(django_filters.FilterSet):
@@ -23,3 +25,57 @@ class BookFilter(django_filters.FilterSet):
             'author_name',
             'publication_date',
         ]
+
+
+class ReviewFilter(django_filters.FilterSet):
+    # Plain id filters: a ModelChoiceFilter would spend a query checking that
+    # the book or user exists.
+    book = django_filters.NumberFilter(field_name='book_id')
+    user = django_filters.NumberFilter(field_name='user_id')
+
+    class Meta:
+        model = Review
+        fields = [
+            'book',
+            'user',
+        ]
+
+
+class BookOrderingFilter(OrderingFilter):
+    # Ties are broken by id in the direction of the last field, which keeps
+    # pages stable and lets the sort use the (field, id) indexes on Book.
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+
+        last = ordering[-1].lstrip('-')
+        if last in ('id', 'pk'):
+            return ordering
+        tiebreak = '-id' if ordering[-1].startswith('-') else 'id'
+        return [*ordering, tiebreak]
+
+
+class PathFilterBackend(DjangoFilterBackend):
+    # Fills the filters named in view.path_filters from the URL kwargs, so a
+    # nested route runs the filterset of its flat listing. They are fixed by
+    # the path and left out of the query parameters of the schema.
+    def get_filterset_kwargs(self, request, queryset, view):
+        kwargs = super().get_filterset_kwargs(request, queryset, view)
+        data = kwargs['data'].copy()
+        for name, kwarg in view.path_filters.items():
+            data[name] = view.kwargs[kwarg]
+        kwargs['data'] = data
+        return kwargs
+
+    def get_schema_fields(self, view):
+        return [
+            field for field in super().get_schema_fields(view)
+            if field.name not in view.path_filters
+        ]
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            parameter for parameter in super().get_schema_operation_parameters(view)
+            if parameter['name'] not in view.path_filters
+        ]
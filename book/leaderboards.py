@@ -0,0 +1,51 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+# Activity weights of the trending score.
+REVIEW_WEIGHT = 2.0
+FAVOURITE_WEIGHT = 1.0
+
+# Trending scores are stored as sum(weight * 2 ** (age / half_life)), with
+# the age measured from a fixed epoch rather than back from now. Every book
+# decays by the same factor as time passes, so the stored values rank books
+# exactly like the decayed scores without ever being rewritten: an event only
+# adds its own term, and undoing it subtracts the same term. Doubles hold
+# about 19 years of 7-day half-lives; move TRENDING_EPOCH forward and run
+# rebuild_leaderboards well before that.
+DEFAULT_TRENDING_EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def trending_epoch():
+    return getattr(settings, 'TRENDING_EPOCH', DEFAULT_TRENDING_EPOCH)
+
+
+def trending_half_life():
+    return datetime.timedelta(days=getattr(settings, 'TRENDING_HALF_LIFE_DAYS', 7))
+
+
+def trending_weight(moment, weight=1.0):
+    return weight * 2 ** ((moment - trending_epoch()) / trending_half_life())
+
+
+def decayed_trending_score(score, now=None):
+    # The score as of now: each event counts weight * 2 ** (-age / half_life).
+    return score / trending_weight(now or timezone.now())
+
+
+def rating_prior():
+    # Bayesian average: every book starts with LEADERBOARD_PRIOR_WEIGHT
+    # virtual reviews of LEADERBOARD_PRIOR_RATING, so a handful of reviews
+    # cannot put a book on top. Changing either needs rebuild_leaderboards.
+    return (
+        float(getattr(settings, 'LEADERBOARD_PRIOR_RATING', 3.0)),
+        float(getattr(settings, 'LEADERBOARD_PRIOR_WEIGHT', 10)),
+    )
+
+
+def bayesian_rating(rating_sum, rating_count):
+    if not rating_count:
+        return 0.0
+    prior_rating, prior_weight = rating_prior()
+    return (prior_rating * prior_weight + rating_sum) / (prior_weight + rating_count)
@@ -0,0 +1,209 @@
+import asyncio
+import itertools
+import math
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authentication.models import User
+from book.models import Book
+
+# (name, sync path, async path); {pk} is the first book.
+ENDPOINTS = [
+    ('book list', '/book/list/', '/book/async/list/'),
+    ('book detail', '/book/detail/{pk}/', '/book/async/detail/{pk}/'),
+    ('favorites list', '/book/favorites-book-list/', '/book/async/favorites-book-list/'),
+]
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') == 'close'
+
+
+class Client:
+    # Minimal HTTP/1.1 keep-alive client, one connection per simulated user,
+    # so the numbers measure the server rather than a client library.
+    def __init__(self, base_url, headers):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.headers = ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n{self.headers}\r\n'.encode()
+        )
+        await self.writer.drain()
+        try:
+            status, closed = await read_response(self.reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.close()
+            raise
+        if closed:
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the throughput of the sync and async book endpoints at high '
+        'concurrency. Starts a sync gunicorn server and a gunicorn + uvicorn '
+        'worker server on the configured database (or uses --sync-url and '
+        '--async-url) and drives both with the same number of concurrent clients.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests per endpoint and server.')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--sync-port', type=int, default=8101)
+        parser.add_argument('--async-port', type=int, default=8102)
+        parser.add_argument('--sync-url', help='Use an already running sync server.')
+        parser.add_argument('--async-url', help='Use an already running async server.')
+        parser.add_argument('--email', help='User for the favourites endpoints; skipped when omitted.')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Repeat identical URLs so cached responses are served. By default '
+                                 'every request gets a unique query parameter and misses the cache.')
+
+    def handle(self, *args, **options):
+        book = Book.objects.order_by('id').first()
+        if book is None:
+            raise CommandError('The catalog is empty; load books first, e.g. with import_catalog.')
+
+        headers = {}
+        endpoints = ENDPOINTS
+        if options['email']:
+            user = User.objects.filter(email=options['email']).first()
+            if user is None:
+                raise CommandError(f'No user with email {options["email"]}.')
+            headers['Authorization'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+        else:
+            endpoints = [endpoint for endpoint in ENDPOINTS if 'favorites' not in endpoint[1]]
+
+        servers = []
+        try:
+            sync_url = options['sync_url'] or self.start_server(
+                servers, 'sync', options['host'], options['sync_port'], options['workers'],
+            )
+            async_url = options['async_url'] or self.start_server(
+                servers, 'uvicorn.workers.UvicornWorker', options['host'], options['async_port'], options['workers'],
+            )
+            for url in (sync_url, async_url):
+                asyncio.run(self.wait_until_ready(url, headers))
+
+            self.stdout.write(
+                f'{options["concurrency"]} concurrent clients, {options["requests"]} requests per run'
+            )
+            self.stdout.write(f'{"endpoint":<24} {"server":<6} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7}')
+            for name, sync_path, async_path in endpoints:
+                for label, url, path in (('sync', sync_url, sync_path), ('async', async_url, async_path)):
+                    result = asyncio.run(self.run(
+                        url, path.format(pk=book.pk), headers, options['concurrency'],
+                        options['requests'], options['warm_cache'],
+                    ))
+                    self.stdout.write(
+                        f'{name:<24} {label:<6} {result["rps"]:>8.0f} {result["p50"]:>8.1f} '
+                        f'{result["p95"]:>8.1f} {result["p99"]:>8.1f} {result["errors"]:>7}'
+                    )
+        finally:
+            for process in servers:
+                process.terminate()
+                process.wait(timeout=30)
+
+    def start_server(self, servers, worker_class, host, port, workers):
+        servers.append(subprocess.Popen([
+            sys.executable, '-m', 'gunicorn',
+            'config.asgi:application' if worker_class != 'sync' else 'config.wsgi:application',
+            '-k', worker_class,
+            '-w', str(workers),
+            '-b', f'{host}:{port}',
+            '--log-level', 'warning',
+        ]))
+        return f'http://{host}:{port}'
+
+    async def wait_until_ready(self, url, headers, timeout=30):
+        deadline = time.monotonic() + timeout
+        while True:
+            client = Client(url, headers)
+            try:
+                await client.get('/book/list/?limit=1')
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise CommandError(f'Server at {url} did not start.')
+                await asyncio.sleep(0.2)
+            finally:
+                client.close()
+
+    async def run(self, url, path, headers, concurrency, requests, warm_cache):
+        counter = itertools.count()
+        timings = []
+        errors = 0
+        separator = '&' if '?' in path else '?'
+
+        async def user():
+            nonlocal errors
+            client = Client(url, headers)
+            try:
+                while (number := next(counter)) < requests:
+                    target = path if warm_cache else f'{path}{separator}_={number}-{time.monotonic_ns()}'
+                    started = time.perf_counter()
+                    try:
+                        status = await client.get(target)
+                    except (OSError, asyncio.IncompleteReadError):
+                        errors += 1
+                        continue
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if status != 200:
+                        errors += 1
+            finally:
+                client.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        if not timings:
+            timings = [0.0]
+        return {
+            'rps': len(timings) / elapsed,
+            'p50': percentile(timings, 50),
+            'p95': percentile(timings, 95),
+            'p99': percentile(timings, 99),
+            'errors': errors,
+        }
@@ -0,0 +1,473 @@
+import datetime
+import json
+import math
+import random
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authentication.blacklist import blacklist_filter
+from authentication.models import ConfirmationCode, User
+from book.models import Author, Book, BookFacetCount, FavoriteBook, Genre, Review
+from book.recommendations import RecommendationBuilder
+from book.search import rebuild_search_index
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+BENCHMARK_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-shared'},
+}
+BATCH_SIZE = 50
+
+
+class Scenario:
+    # One request shape. budget is the most SQL queries a single request may
+    # run; paged scenarios are repeated for every --page-sizes value.
+    # prepare(bench, iteration) runs untimed before each request and returns
+    # the URL kwargs and/or request data to use.
+    def __init__(self, name, url_name, budget, method='get', params=None, data=None,
+                 auth=False, paged=False, status=200, prepare=None):
+        self.name = name
+        self.url_name = url_name
+        self.budget = budget
+        self.method = method
+        self.params = params or {}
+        self.data = data
+        self.auth = auth
+        self.paged = paged
+        self.status = status
+        self.prepare = prepare
+
+
+def prepare_book(bench, iteration):
+    return {'kwargs': {'pk': bench.book_ids[0]}}
+
+
+def prepare_genre_leaderboard(bench, iteration):
+    return {'kwargs': {'board': 'top-rated', 'genre_id': bench.genre_ids[iteration % len(bench.genre_ids)]}}
+
+
+def prepare_author_leaderboard(bench, iteration):
+    return {'kwargs': {'board': 'trending', 'author_id': bench.author_ids[iteration % len(bench.author_ids)]}}
+
+
+def prepare_review(bench, iteration):
+    return {'kwargs': {'pk': bench.review.pk}}
+
+
+def prepare_book_reviews(bench, iteration):
+    return {'params': {'book': bench.book_ids[iteration % len(bench.book_ids)], 'pagination': 'cursor'}}
+
+
+def prepare_user_reviews(bench, iteration):
+    return {'params': {'user': bench.user.pk, 'pagination': 'cursor'}}
+
+
+def prepare_review_create(bench, iteration):
+    return {'data': {
+        'book': bench.book_ids[iteration % len(bench.book_ids)],
+        'user': bench.user.pk,
+        'rating': iteration % 5 + 1,
+        'comment': 'Benchmark review',
+    }}
+
+
+def prepare_review_update(bench, iteration):
+    return {'kwargs': {'pk': bench.review.pk}, 'data': {
+        'book': bench.review.book_id,
+        'user': bench.user.pk,
+        'rating': iteration % 5 + 1,
+        'comment': 'Updated benchmark review',
+    }}
+
+
+def prepare_review_delete(bench, iteration):
+    review = Review.objects.create(
+        book_id=bench.book_ids[iteration % len(bench.book_ids)],
+        user=bench.user,
+        rating=3,
+        comment='Benchmark review',
+    )
+    return {'kwargs': {'pk': review.pk}}
+
+
+def prepare_add_favorite(bench, iteration):
+    book_id = bench.book_ids[-1 - iteration % len(bench.book_ids)]
+    FavoriteBook.objects.filter(user=bench.user, book_id=book_id).delete()
+    return {'kwargs': {'book_id': book_id}}
+
+
+def prepare_remove_favorite(bench, iteration):
+    book_id = bench.book_ids[-1 - iteration % len(bench.book_ids)]
+    FavoriteBook.objects.get_or_create(user=bench.user, book_id=book_id)
+    return {'kwargs': {'book_id': book_id}}
+
+
+def prepare_batch_add(bench, iteration):
+    book_ids = bench.book_ids[-BATCH_SIZE:]
+    FavoriteBook.objects.filter(user=bench.user, book_id__in=book_ids).delete()
+    return {'data': {'book_ids': book_ids}}
+
+
+def prepare_batch_remove(bench, iteration):
+    book_ids = bench.book_ids[-BATCH_SIZE:]
+    FavoriteBook.objects.bulk_create(
+        [FavoriteBook(user=bench.user, book_id=book_id) for book_id in book_ids],
+        ignore_conflicts=True,
+    )
+    Book.rebuild_favourites_count(book_ids)
+    return {'data': {'book_ids': book_ids}}
+
+
+def prepare_register(bench, iteration):
+    bench.sequence += 1
+    return {'data': {
+        'email': f'register{bench.sequence}@benchmark.local',
+        'password': BENCHMARK_PASSWORD,
+        'confirm_password': BENCHMARK_PASSWORD,
+    }}
+
+
+def prepare_confirm(bench, iteration):
+    bench.sequence += 1
+    email = f'confirm{bench.sequence}@benchmark.local'
+    user = User.objects.create_user(email=email, password=BENCHMARK_PASSWORD)
+    code = ConfirmationCode.generate_code()
+    ConfirmationCode.objects.create(user=user, code=code)
+    return {'data': {'email': email, 'code': code}}
+
+
+def prepare_resend_code(bench, iteration):
+    bench.sequence += 1
+    email = f'resend{bench.sequence}@benchmark.local'
+    user = User.objects.create_user(email=email, password=BENCHMARK_PASSWORD)
+    ConfirmationCode.objects.create(user=user, code=ConfirmationCode.generate_code())
+    return {'data': {'email': email}}
+
+
+def prepare_login(bench, iteration):
+    # Keeps the login throttle windows empty when caches are kept warm.
+    caches['shared'].clear()
+    return {}
+
+
+def prepare_refresh(bench, iteration):
+    # Measures a worker whose blacklist filter is within its sync interval.
+    blacklist_filter.sync()
+    return {'data': {'refresh': str(RefreshToken.for_user(bench.user))}}
+
+
+def prepare_logout(bench, iteration):
+    return {'data': {'refresh_token': str(RefreshToken.for_user(bench.user))}}
+
+
+SCENARIOS = [
+    Scenario('book list', 'book-list', 2, paged=True),
+    Scenario('book list filtered', 'book-list', 2, paged=True, params={
+        'genre_name': 'genre 1', 'ordering': '-average_rating',
+    }),
+    Scenario('book list cursor', 'book-list', 1, paged=True, params={'pagination': 'cursor'}),
+    Scenario('book list signed in', 'book-list', 4, paged=True, auth=True),
+    Scenario('book facets', 'book-facets', 5, paged=True),
+    Scenario('book facets filtered', 'book-facets', 5, paged=True, params={
+        'genre_name': 'genre 1', 'publication_date_after': '1980-01-01',
+    }),
+    Scenario('top-rated leaderboard', 'leaderboard', 1, paged=True,
+             prepare=lambda bench, iteration: {'kwargs': {'board': 'top-rated'}}),
+    Scenario('trending leaderboard', 'leaderboard', 1, paged=True,
+             prepare=lambda bench, iteration: {'kwargs': {'board': 'trending'}}),
+    Scenario('genre leaderboard', 'genre-leaderboard', 1, paged=True, prepare=prepare_genre_leaderboard),
+    Scenario('author leaderboard', 'author-leaderboard', 1, paged=True, prepare=prepare_author_leaderboard),
+    Scenario('book detail', 'book-detail', 2, prepare=prepare_book),
+    Scenario('book recommendations', 'book-recommendations', 1, paged=True, prepare=prepare_book),
+    Scenario('book reviews', 'book-review-list', 1, paged=True, params={'pagination': 'cursor'},
+             prepare=prepare_book),
+    Scenario('book export', 'book-export', 1, params={'genre_name': 'genre 1'}),
+    Scenario('book search', 'book-search', 3, paged=True, params={'q': 'book'}),
+    Scenario('async book list', 'async-book-list', 2, paged=True),
+    Scenario('async book detail', 'async-book-detail', 2, prepare=prepare_book),
+    Scenario('async favorites list', 'async-favorites-book-list', 3, paged=True, auth=True),
+    Scenario('review list', 'review-list', 2, paged=True),
+    Scenario('review list by book', 'review-list', 1, paged=True, prepare=prepare_book_reviews),
+    Scenario('review list by user', 'review-list', 1, paged=True, prepare=prepare_user_reviews),
+    Scenario('review create', 'review-list', 7, method='post', auth=True, status=201,
+             prepare=prepare_review_create),
+    Scenario('review detail', 'review-detail', 2, auth=True, prepare=prepare_review),
+    Scenario('review update', 'review-detail', 9, method='put', auth=True,
+             prepare=prepare_review_update),
+    Scenario('review delete', 'review-detail', 6, method='delete', auth=True, status=204,
+             prepare=prepare_review_delete),
+    Scenario('favorites list', 'favorites-book-list', 4, paged=True, auth=True),
+    Scenario('add to favorites', 'add-to-favorites', 7, method='post', auth=True, status=201,
+             prepare=prepare_add_favorite),
+    Scenario('remove from favorites', 'remove-from-favorites', 7, method='delete', auth=True,
+             status=204, prepare=prepare_remove_favorite),
+    Scenario('batch add to favorites', 'batch-add-to-favorites', 8, method='post', auth=True,
+             prepare=prepare_batch_add),
+    Scenario('batch remove from favorites', 'batch-remove-from-favorites', 8, method='post',
+             auth=True, prepare=prepare_batch_remove),
+    Scenario('login', 'token_obtain_pair', 2, method='post', prepare=prepare_login, data={
+        'email': 'reader@benchmark.local', 'password': BENCHMARK_PASSWORD,
+    }),
+    Scenario('token refresh', 'token_refresh', 1, method='post', prepare=prepare_refresh),
+    Scenario('register', 'user-registration', 6, method='post', status=201,
+             prepare=prepare_register),
+    Scenario('email confirm', 'email-confirm', 5, method='post', prepare=prepare_confirm),
+    Scenario('email confirm resend', 'email-confirm-resend', 6, method='post',
+             prepare=prepare_resend_code),
+    Scenario('logout', 'logout', 7, method='post', auth=True, prepare=prepare_logout),
+]
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway test database and drives every book and authentication '
+        'endpoint through the test client, recording latency percentiles and SQL '
+        'query counts. Fails when a query budget is exceeded or an endpoint is '
+        'slower than the committed baseline, benchmarks/endpoints.json. Uses the '
+        'configured database engine: SQLite by default, PostgreSQL when DEBUG and '
+        'the DB_* settings point to it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--reviews-per-book', type=int, default=5)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--page-sizes', default='10,50,100')
+        parser.add_argument('--only', help='Run only scenarios whose name contains this text.')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep response caches between requests instead of clearing them.')
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'endpoints.json'))
+        parser.add_argument('--update-baseline', action='store_true')
+        parser.add_argument('--skip-baseline', action='store_true',
+                            help='Only check the query budgets, without comparing against the baseline.')
+        parser.add_argument('--max-slowdown', type=float, default=1.5,
+                            help='Allowed p50 ratio against the baseline.')
+        parser.add_argument('--tolerance-ms', type=float, default=2.0,
+                            help='Slowdowns smaller than this are ignored as noise.')
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        self.check_coverage()
+        page_sizes = [int(size) for size in options['page_sizes'].split(',') if size]
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if not options['only'] or options['only'] in scenario.name
+        ]
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+                self.seed(options)
+                results = self.run_scenarios(scenarios, page_sizes, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        failures = [
+            f'{key}: {result["queries"]} queries, budget {result["budget"]}'
+            for key, result in results.items()
+            if result['queries'] > result['budget']
+        ]
+        failures += [
+            f'{key}: unexpected status {", ".join(map(str, result["statuses"]))}'
+            for key, result in results.items()
+            if result['unexpected_status']
+        ]
+        failures += self.compare_with_baseline(results, options)
+
+        if options['update_baseline']:
+            path = Path(options['baseline'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f'Baseline written to {path}')
+
+        if failures:
+            raise CommandError('Benchmark failed:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All endpoints are within budget.'))
+
+    def check_coverage(self):
+        from authentication.urls import urlpatterns as auth_patterns
+        from book.urls import urlpatterns as book_patterns
+
+        url_names = {pattern.name for pattern in book_patterns + auth_patterns}
+        missing = url_names - {scenario.url_name for scenario in SCENARIOS}
+        if missing:
+            raise CommandError(f'No benchmark scenario for: {", ".join(sorted(missing))}')
+
+    def seed(self, options):
+        started = time.monotonic()
+        rng = random.Random(0)
+        password = make_password(BENCHMARK_PASSWORD)
+        users = User.objects.bulk_create([
+            User(email=f'user{i}@benchmark.local', password=password, is_verified=True)
+            for i in range(options['users'])
+        ])
+        self.user = User.objects.create_user(email='reader@benchmark.local', password=BENCHMARK_PASSWORD)
+        self.user.is_verified = True
+        self.user.save()
+
+        genres = Genre.objects.bulk_create([Genre(name=f'Genre {i}') for i in range(20)])
+        authors = Author.objects.bulk_create([Author(name=f'Author {i}') for i in range(200)])
+        start = datetime.date(1950, 1, 1)
+        Book.objects.bulk_create([
+            Book(
+                title=f'Book {i}',
+                description=f'Description of book {i}',
+                genre=genres[i % len(genres)],
+                author=authors[rng.randrange(len(authors))],
+                publication_date=start + datetime.timedelta(days=rng.randrange(25000)),
+            )
+            for i in range(options['books'])
+        ], batch_size=1000)
+        self.book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+        self.genre_ids = [genre.pk for genre in genres]
+        self.author_ids = [author.pk for author in authors]
+
+        now = timezone.now()
+        Review.objects.bulk_create([
+            Review(
+                book_id=book_id,
+                user=users[rng.randrange(len(users))] if users else self.user,
+                rating=rng.randint(1, 5),
+                comment='Seeded review',
+                created_at=now - datetime.timedelta(minutes=rng.randrange(60 * 24 * 90)),
+            )
+            for book_id in self.book_ids
+            for _ in range(options['reviews_per_book'])
+        ], batch_size=1000)
+        FavoriteBook.objects.bulk_create([
+            FavoriteBook(user=self.user, book_id=book_id)
+            for book_id in self.book_ids[:100]
+        ] + [
+            FavoriteBook(user=user, book_id=book_id)
+            for user in users
+            for book_id in rng.sample(self.book_ids[:300], min(20, len(self.book_ids[:300])))
+        ])
+        Book.rebuild_rating_aggregates()
+        Book.rebuild_favourites_count()
+        Book.rebuild_trending_scores()
+        BookFacetCount.rebuild()
+        RecommendationBuilder().build()
+        rebuild_search_index()
+
+        self.review = Review.objects.create(
+            book_id=self.book_ids[0], user=self.user, rating=4, comment='Benchmark review',
+        )
+        self.sequence = 0
+        self.access_token = str(RefreshToken.for_user(self.user).access_token)
+        self.stdout.write(
+            f'Seeded {len(self.book_ids)} books, {options["users"] + 1} users on '
+            f'{connection.vendor} in {time.monotonic() - started:.1f}s'
+        )
+
+    def run_scenarios(self, scenarios, page_sizes, options):
+        results = {}
+        self.stdout.write(f'{"endpoint":<40} {"p50 ms":>8} {"p95 ms":>8} {"max ms":>8} {"queries":>8}')
+        for scenario in scenarios:
+            for page_size in (page_sizes if scenario.paged else [None]):
+                key = scenario.name if page_size is None else f'{scenario.name} [limit={page_size}]'
+                result = self.run_scenario(scenario, page_size, options)
+                results[key] = result
+                marker = '' if result['queries'] <= result['budget'] else ' over budget'
+                self.stdout.write(
+                    f'{key:<40} {result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} '
+                    f'{result["max_ms"]:>8.2f} {result["queries"]:>8}{marker}'
+                )
+        return results
+
+    def run_scenario(self, scenario, page_size, options):
+        client = Client()
+        headers = {}
+        if scenario.auth:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {self.access_token}'
+
+        timings = []
+        queries = 0
+        statuses = set()
+        for iteration in range(options['warmup'] + options['iterations']):
+            request = {
+                'kwargs': {},
+                'params': dict(scenario.params),
+                'data': scenario.data,
+            }
+            if scenario.prepare is not None:
+                request.update(scenario.prepare(self, iteration))
+            if page_size is not None:
+                request['params']['limit'] = page_size
+            if not options['warm_cache']:
+                caches['default'].clear()
+                caches['shared'].clear()
+
+            url = reverse(scenario.url_name, kwargs=request['kwargs'])
+            if scenario.method == 'get':
+                call = lambda: client.get(url, request['params'], **headers)
+            else:
+                call = lambda: getattr(client, scenario.method)(
+                    url, request['data'], content_type='application/json', **headers,
+                )
+
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = call()
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+
+            if iteration < options['warmup']:
+                continue
+            timings.append(elapsed * 1000)
+            queries = max(queries, len(captured))
+            statuses.add(response.status_code)
+
+        return {
+            'budget': scenario.budget,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'max_ms': round(max(timings), 3),
+            'queries': queries,
+            'statuses': sorted(statuses),
+            'unexpected_status': statuses != {scenario.status},
+        }
+
+    def compare_with_baseline(self, results, options):
+        path = Path(options['baseline'])
+        if options['update_baseline'] or options['skip_baseline']:
+            return []
+        if not path.exists():
+            return [f'No baseline at {path}; run with --update-baseline to create one, or --skip-baseline.']
+
+        baseline = json.loads(path.read_text())
+        failures = []
+        for key, result in results.items():
+            previous = baseline.get(key)
+            if previous is None:
+                continue
+            slower_by = result['p50_ms'] - previous['p50_ms']
+            if (result['p50_ms'] > previous['p50_ms'] * options['max_slowdown']
+                    and slower_by > options['tolerance_ms']):
+                failures.append(
+                    f'{key}: p50 {result["p50_ms"]:.2f}ms, baseline {previous["p50_ms"]:.2f}ms'
+                )
+            if result['queries'] > previous['queries']:
+                self.stdout.write(self.style.WARNING(
+                    f'{key}: {result["queries"]} queries, baseline {previous["queries"]}'
+                ))
+        return failures
@@ -0,0 +1,116 @@
+import datetime
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from authentication.models import User
+from book.models import Author, Book, Genre, Review
+from book.serializers import (
+    BookListSerializer,
+    BookSerializer,
+    ReviewListSerializer,
+    ReviewSerializer,
+)
+
+# (name, model serializer and its queryset, fast path serializer and its rows)
+CASES = [
+    (
+        'book',
+        BookSerializer, lambda: Book.objects.select_related('genre', 'author').order_by('id'),
+        BookListSerializer, lambda: BookListSerializer.rows(Book.objects.order_by('id')),
+    ),
+    (
+        'review',
+        ReviewSerializer, lambda: Review.objects.order_by('id'),
+        ReviewListSerializer, lambda: ReviewListSerializer.rows(Review.objects.order_by('id')),
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the rows per second of the model serializers used by the list '
+        'endpoints with their values() fast paths, for serialization alone and '
+        'together with the page query. Runs on a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000')
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size]
+        if not sizes:
+            raise CommandError('--sizes needs at least one page size.')
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            self.seed(max(sizes))
+            self.stdout.write(
+                f'{"serializer":<10} {"rows":>6} {"mode":<10} {"current rows/s":>15} '
+                f'{"fast rows/s":>12} {"speedup":>8}'
+            )
+            for case in CASES:
+                for size in sizes:
+                    self.run_case(case, size, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+    def seed(self, count):
+        user = User.objects.create_user(email='reader@benchmark.local', password='benchmark-password')
+        genre = Genre.objects.create(name='Genre')
+        author = Author.objects.create(name='Author')
+        Book.objects.bulk_create([
+            Book(
+                title=f'Book {i}',
+                description=f'Description of book {i}',
+                genre=genre,
+                author=author,
+                publication_date=datetime.date(1950, 1, 1) + datetime.timedelta(days=i),
+                average_rating=(i % 500) / 100 + 1 / 3,
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        book_ids = list(Book.objects.values_list('id', flat=True))
+        Review.objects.bulk_create([
+            Review(book_id=book_id, user=user, rating=book_id % 5 + 1, comment=f'Review {book_id}')
+            for book_id in book_ids
+        ], batch_size=1000)
+
+    def run_case(self, case, size, repeat):
+        name, current_class, current_queryset, fast_class, fast_rows = case
+
+        def current(query):
+            rows = list(current_queryset()[:size]) if query else current_rows
+            return current_class(rows, many=True).data
+
+        def fast(query):
+            rows = list(fast_rows()[:size]) if query else fast_rows_cache
+            return fast_class(rows, many=True).data
+
+        current_rows = list(current_queryset()[:size])
+        fast_rows_cache = list(fast_rows()[:size])
+        if json.dumps(current(False)) != json.dumps(fast(False)):
+            raise CommandError(f'The {name} fast path renders different JSON than {current_class.__name__}.')
+
+        for mode, query in (('serialize', False), ('with query', True)):
+            current_rate = size / self.measure(lambda: current(query), repeat)
+            fast_rate = size / self.measure(lambda: fast(query), repeat)
+            self.stdout.write(
+                f'{name:<10} {size:>6} {mode:<10} {current_rate:>15,.0f} '
+                f'{fast_rate:>12,.0f} {fast_rate / current_rate:>7.1f}x'
+            )
+
+    def measure(self, function, repeat):
+        function()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from book.recommendations import RecommendationBuilder
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds the "readers also favourited" recommendations: the top-K most '
+        'similar books of every book by cosine similarity of their favourites '
+        '(and optionally good reviews). --incremental only recomputes the books '
+        'with new interactions since the last build and the books co-read with '
+        'them, and exits without loading anything when there are none. It still '
+        'reads every interaction otherwise, so it saves the similarity products, '
+        'not the I/O. Run a full build periodically to drop removed favourites.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true')
+        parser.add_argument('--top-k', type=int, default=50)
+        parser.add_argument('--include-reviews', action='store_true',
+                            help='Count reviews rated at least --min-rating as interactions.')
+        parser.add_argument('--min-rating', type=int, default=4)
+        parser.add_argument('--min-common', type=int, default=1,
+                            help='Readers two books need in common to be neighbours.')
+        parser.add_argument('--max-user-items', type=int, default=1000,
+                            help='Ignore users with more interactions than this; 0 for no limit.')
+        parser.add_argument('--block-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        builder = RecommendationBuilder(
+            top_k=options['top_k'],
+            include_reviews=options['include_reviews'],
+            min_rating=options['min_rating'],
+            min_common=options['min_common'],
+            max_user_items=options['max_user_items'],
+            block_size=options['block_size'],
+            log=lambda message: self.stdout.write(f'{time.monotonic() - started:7.1f}s {message}'),
+        )
+        build = builder.build(incremental=options['incremental'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Recommendations of {build.books_updated} books rebuilt '
+            f'({"incremental" if build.incremental else "full"}) in {time.monotonic() - started:.1f}s.'
+        ))
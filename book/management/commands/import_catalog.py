@@ -0,0 +1,147 @@
+import csv
+import datetime
+import itertools
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from book.cache import invalidate_catalog
+from book.models import (
+    Author,
+    Book,
+    BookFacetCount,
+    Genre,
+)
+from book.search import rebuild_search_index
+
+FIELDS = ('title', 'description', 'publication_date', 'genre', 'author')
+
+
+class NameResolver:
+    # Name -> id map for Genre/Author. Names unseen so far are looked up
+    # and created for a whole chunk at once.
+    def __init__(self, model):
+        self.model = model
+        self.ids = {}
+
+    def resolve(self, names):
+        missing = {name for name in names if name not in self.ids}
+        if not missing:
+            return
+        # Iterating newest first leaves the oldest row for duplicated names.
+        existing = self.model.objects.filter(name__in=missing).order_by('-id')
+        for pk, name in existing.values_list('id', 'name'):
+            self.ids[name] = pk
+        created = self.model.objects.bulk_create(
+            [self.model(name=name) for name in missing if name not in self.ids]
+        )
+        for obj in created:
+            self.ids[obj.name] = obj.pk
+
+
+class Command(BaseCommand):
+    help = 'Streams books from a JSONL or CSV file into the catalog in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, or - for stdin.')
+        parser.add_argument('--format', choices=['jsonl', 'csv'])
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        batch_size = options['batch_size']
+
+        self.genres = NameResolver(Genre)
+        self.authors = NameResolver(Author)
+        self.skipped = 0
+        imported = 0
+        started = time.monotonic()
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            rows = self.read_rows(stream, file_format)
+            while True:
+                chunk = list(itertools.islice(rows, batch_size))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    imported += self.import_chunk(chunk)
+                self.report(imported, started)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write('Rebuilding derived data...')
+        with transaction.atomic():
+            rebuild_search_index()
+            BookFacetCount.rebuild()
+            invalidate_catalog()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} books, skipped {self.skipped} invalid rows.'
+        ))
+        self.report(imported, started)
+
+    def read_rows(self, stream, file_format):
+        if file_format == 'csv':
+            reader = csv.DictReader(stream)
+            missing = set(FIELDS) - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(f'Missing CSV columns: {", ".join(sorted(missing))}')
+            for line_number, row in enumerate(reader, start=2):
+                yield line_number, row
+        else:
+            for line_number, line in enumerate(stream, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError:
+                    self.skip(line_number, 'invalid JSON')
+
+    def clean_row(self, line_number, row):
+        try:
+            values = {field: (row[field] or '').strip() for field in FIELDS}
+            values['publication_date'] = datetime.date.fromisoformat(values['publication_date'])
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            self.skip(line_number, f'{type(e).__name__}: {e}')
+            return None
+        if not values['title'] or not values['genre'] or not values['author']:
+            self.skip(line_number, 'title, genre and author are required')
+            return None
+        if max(len(values['title']), len(values['genre']), len(values['author'])) > 100:
+            self.skip(line_number, 'title, genre and author are limited to 100 characters')
+            return None
+        return values
+
+    def import_chunk(self, chunk):
+        rows = [
+            values for values in (self.clean_row(*item) for item in chunk)
+            if values is not None
+        ]
+        self.genres.resolve(row['genre'] for row in rows)
+        self.authors.resolve(row['author'] for row in rows)
+        Book.objects.bulk_create([
+            Book(
+                title=row['title'],
+                description=row['description'],
+                publication_date=row['publication_date'],
+                genre_id=self.genres.ids[row['genre']],
+                author_id=self.authors.ids[row['author']],
+            )
+            for row in rows
+        ])
+        return len(rows)
+
+    def skip(self, line_number, reason):
+        self.skipped += 1
+        self.stderr.write(f'Line {line_number} skipped: {reason}')
+
+    def report(self, imported, started):
+        elapsed = time.monotonic() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(f'{imported} books in {elapsed:.1f}s ({rate:.0f} rows/s)')
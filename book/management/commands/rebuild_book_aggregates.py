@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from book.cache import invalidate_catalog
+from book.models import Book, BookFacetCount
+
+
+class Command(BaseCommand):
+    help = 'Recalculates the denormalized rating and favourite counters of every book and the facet counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = Book.rebuild_rating_aggregates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rating aggregates rebuilt for {updated} reviewed books.'
+        ))
+        updated = Book.rebuild_favourites_count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Favourite counters rebuilt for {updated} books.'
+        ))
+        updated = BookFacetCount.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Facet counts rebuilt for {updated} genres, authors and years.'
+        ))
+        invalidate_catalog()
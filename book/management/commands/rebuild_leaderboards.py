@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from book.cache import invalidate_catalog
+from book.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Recalculates the top-rated and trending leaderboard scores of every book from reviews and favourites.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = Book.rebuild_rating_aggregates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Weighted ratings rebuilt for {updated} reviewed books.'
+        ))
+        updated = Book.rebuild_trending_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Trending scores rebuilt for {updated} books with activity.'
+        ))
+        invalidate_catalog()
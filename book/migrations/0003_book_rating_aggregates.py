@@ -0,0 +1,79 @@
+# Generated by Django 4.2.8 on 2026-10-18 15:43
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    Review = apps.get_model('book', 'Review')
+
+    totals = Review.objects.order_by().values('book_id').annotate(
+        total=Sum('rating'),
+        count=Count('id'),
+        **{
+            f'count_{rating}': Count('id', filter=Q(rating=rating))
+            for rating in range(1, 6)
+        },
+    )
+    for row in totals.iterator():
+        Book.objects.filter(pk=row['book_id']).update(
+            average_rating=row['total'] / row['count'],
+            rating_sum=row['total'],
+            rating_count=row['count'],
+            **{
+                f'rating_{rating}_count': row[f'count_{rating}']
+                for rating in range(1, 6)
+            },
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0002_book_favourites_alter_favoritebook_user_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='average_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.8 on 2026-10-18 15:43
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_favourites_count(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    FavoriteBook = apps.get_model('book', 'FavoriteBook')
+
+    favourites = FavoriteBook.objects.filter(
+        book=OuterRef('pk'),
+    ).order_by().values('book').annotate(count=Count('id')).values('count')
+    Book.objects.update(favourites_count=Coalesce(Subquery(favourites), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0003_book_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='favourites_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_favourites_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['average_rating', 'id'], name='book_average_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['rating_count', 'id'], name='book_rating_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['publication_date', 'id'], name='book_publication_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title', 'id'], name='book_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['favourites_count', 'id'], name='book_favourites_count_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE book_search_index ('
+            'book_id bigint PRIMARY KEY REFERENCES book_book (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX book_search_index_document_idx '
+            'ON book_search_index USING GIN (document)'
+        )
+        schema_editor.execute(
+            'INSERT INTO book_search_index (book_id, document) '
+            "SELECT b.id, setweight(to_tsvector('simple', b.title), 'A') || "
+            "setweight(to_tsvector('simple', a.name), 'B') || "
+            "setweight(to_tsvector('simple', b.description), 'C') "
+            'FROM book_book b JOIN book_author a ON a.id = b.author_id'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE book_search_index USING fts5('
+            "title, author, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO book_search_index (rowid, title, author, description) '
+            'SELECT b.id, b.title, a.name, b.description '
+            'FROM book_book b JOIN book_author a ON a.id = b.author_id'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE IF EXISTS book_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0004_book_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
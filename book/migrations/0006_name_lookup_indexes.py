@@ -0,0 +1,35 @@
+from django.db import migrations
+
+NAME_INDEXES = (
+    ('book_genre_name_ci_idx', 'book_genre'),
+    ('book_author_name_ci_idx', 'book_author'),
+)
+
+
+def create_name_indexes(apps, schema_editor):
+    # BookFilter matches genre/author names with iexact, which compiles to
+    # UPPER(name) = UPPER(%s) on PostgreSQL and to a case-insensitive LIKE
+    # on SQLite. Each form needs its own index to avoid scanning the table.
+    vendor = schema_editor.connection.vendor
+    for name, table in NAME_INDEXES:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'CREATE INDEX {name} ON {table} (UPPER(name))')
+        elif vendor == 'sqlite':
+            schema_editor.execute(f'CREATE INDEX {name} ON {table} (name COLLATE NOCASE)')
+
+
+def drop_name_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        for name, _ in NAME_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0005_book_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_indexes, drop_name_indexes),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.8 on 2026-10-18 16:09
+
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.db.models.functions import ExtractYear
+
+
+def populate_facet_counts(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    BookFacetCount = apps.get_model('book', 'BookFacetCount')
+
+    books = Book.objects.order_by()
+    expressions = {
+        'genre': F('genre_id'),
+        'author': F('author_id'),
+        'year': ExtractYear('publication_date'),
+    }
+    BookFacetCount.objects.bulk_create([
+        BookFacetCount(dimension=dimension, key=row['key'], count=row['count'])
+        for dimension, expression in expressions.items()
+        for row in books.values(key=expression).annotate(count=Count('id'))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0006_name_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('genre', 'Genre'), ('author', 'Author'), ('year', 'Publication year')], max_length=10)),
+                ('key', models.IntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', '-count', 'key'], name='book_facet_count_idx')],
+                'unique_together': {('dimension', 'key')},
+            },
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 4.2.8 on 2026-10-18 16:11
+
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+import django.utils.timezone
+
+# The formulas of book.leaderboards as of this migration, inlined so that
+# later changes to that module do not rewrite history.
+REVIEW_WEIGHT = 2.0
+FAVOURITE_WEIGHT = 1.0
+BATCH_SIZE = 1000
+
+
+def populate_leaderboard_scores(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    Review = apps.get_model('book', 'Review')
+    FavoriteBook = apps.get_model('book', 'FavoriteBook')
+
+    epoch = getattr(settings, 'TRENDING_EPOCH', datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+    half_life = datetime.timedelta(days=getattr(settings, 'TRENDING_HALF_LIFE_DAYS', 7))
+    prior_rating = float(getattr(settings, 'LEADERBOARD_PRIOR_RATING', 3.0))
+    prior_weight = float(getattr(settings, 'LEADERBOARD_PRIOR_WEIGHT', 10))
+
+    scores = defaultdict(float)
+    for model, weight in ((Review, REVIEW_WEIGHT), (FavoriteBook, FAVOURITE_WEIGHT)):
+        rows = model.objects.values_list('book_id', 'created_at').iterator(chunk_size=BATCH_SIZE)
+        for book_id, created_at in rows:
+            scores[book_id] += weight * 2 ** ((created_at - epoch) / half_life)
+
+    batch = []
+    books = Book.objects.only('id', 'rating_sum', 'rating_count').order_by('id')
+    for book in books.iterator(chunk_size=BATCH_SIZE):
+        if not book.rating_count and book.pk not in scores:
+            continue
+        book.weighted_rating = (
+            (prior_rating * prior_weight + book.rating_sum) / (prior_weight + book.rating_count)
+            if book.rating_count else 0.0
+        )
+        book.trending_score = scores.get(book.pk, 0.0)
+        batch.append(book)
+        if len(batch) >= BATCH_SIZE:
+            Book.objects.bulk_update(batch, ['weighted_rating', 'trending_score'])
+            batch = []
+    if batch:
+        Book.objects.bulk_update(batch, ['weighted_rating', 'trending_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0007_book_facet_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='weighted_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='favoritebook',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['weighted_rating', 'id'], name='book_weighted_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre', 'weighted_rating', 'id'], name='book_genre_weighted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'weighted_rating', 'id'], name='book_author_weighted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['trending_score', 'id'], name='book_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre', 'trending_score', 'id'], name='book_genre_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'trending_score', 'id'], name='book_author_trending_idx'),
+        ),
+        migrations.RunPython(populate_leaderboard_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-18 16:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0008_leaderboard_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('incremental', models.BooleanField(default=False)),
+                ('include_reviews', models.BooleanField(default=False)),
+                ('min_rating', models.PositiveSmallIntegerField(default=4)),
+                ('top_k', models.PositiveSmallIntegerField()),
+                ('favourite_watermark', models.BigIntegerField(default=0)),
+                ('review_watermark', models.BigIntegerField(default=0)),
+                ('books_updated', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='book.book')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='book.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', '-score', 'recommended'], name='book_recommendation_idx')],
+                'unique_together': {('book', 'recommended')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-18 16:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0010_review_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationbuild',
+            name='max_user_items',
+            field=models.PositiveIntegerField(default=1000),
+        ),
+        migrations.AddField(
+            model_name='recommendationbuild',
+            name='min_common',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -1,11 +1,40 @@
-from django.db import models
-from django.db.models import Avg
-from django.core.cache import cache
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import (
+    DEFERRED,
+    Case,
+    Count,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import (
+    Cast,
+    Coalesce,
+    ExtractYear,
+    NullIf,
+)
 from authentication.models import User
 from django.core.validators import (
     MinValueValidator,
     MaxValueValidator,
 )
+from django.utils import timezone
+from book.leaderboards import (
+    FAVOURITE_WEIGHT,
+    REVIEW_WEIGHT,
+    bayesian_rating,
+    rating_prior,
+    trending_weight,
+)
+
+RATING_VALUES = range(1, 6)
 
 
 class Genre(models.Model):
@@ -43,42 +72,325 @@ class Book(models.Model):
         related_name="favorite_books",
     )
 
-    @property
-    def average_rating(self):
-        reviews = self.reviews.all()
-        average = reviews.aggregate(Avg('rating'))['rating__avg']
-        return round(average, 2) if average is not None else 0
+    # Denormalized review aggregates, maintained by book.signals.
+    average_rating = models.FloatField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    favourites_count = models.PositiveIntegerField(default=0)
+
+    # Leaderboard scores, maintained by book.signals; see book.leaderboards.
+    weighted_rating = models.FloatField(default=0)
+    trending_score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['average_rating', 'id'], name='book_average_rating_idx'),
+            models.Index(fields=['rating_count', 'id'], name='book_rating_count_idx'),
+            models.Index(fields=['publication_date', 'id'], name='book_publication_date_idx'),
+            models.Index(fields=['title', 'id'], name='book_title_idx'),
+            models.Index(fields=['favourites_count', 'id'], name='book_favourites_count_idx'),
+            models.Index(fields=['weighted_rating', 'id'], name='book_weighted_rating_idx'),
+            models.Index(fields=['genre', 'weighted_rating', 'id'], name='book_genre_weighted_idx'),
+            models.Index(fields=['author', 'weighted_rating', 'id'], name='book_author_weighted_idx'),
+            models.Index(fields=['trending_score', 'id'], name='book_trending_idx'),
+            models.Index(fields=['genre', 'trending_score', 'id'], name='book_genre_trending_idx'),
+            models.Index(fields=['author', 'trending_score', 'id'], name='book_author_trending_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if all(loaded.get(name, DEFERRED) is not DEFERRED for name in BookFacetCount.BOOK_FIELDS):
+            instance._facet_snapshot = instance.facet_keys
+        return instance
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.update_cached_average_rating()
+        # Keeps the row and the facet counts (see book.signals) in one
+        # transaction.
+        with transaction.atomic():
+            self.load_facet_snapshot()
+            super().save(*args, **kwargs)
+
+    def load_facet_snapshot(self):
+        # For a book loaded without all the facet fields, reads the stored
+        # keys so book.signals can still apply a delta.
+        if self.pk is None or hasattr(self, '_facet_snapshot'):
+            return
+        stored = Book.objects.filter(pk=self.pk).select_for_update().only(
+            'genre', 'author', 'publication_date',
+        ).first()
+        if stored is not None:
+            self._facet_snapshot = stored._facet_snapshot
+
+    @property
+    def facet_keys(self):
+        return {
+            BookFacetCount.GENRE: self.genre_id,
+            BookFacetCount.AUTHOR: self.author_id,
+            BookFacetCount.YEAR: self.publication_date.year,
+        }
 
-    def update_cached_average_rating(self):
-        cache_key = f'book_average_rating_{self.id}'
-        reviews = self.reviews.all()
-        average = reviews.aggregate(Avg('rating'))['rating__avg']
-        average_rating = round(average, 2) if average is not None else 0
-        cache.set(cache_key, average_rating, timeout=60)
+    @property
+    def rating_histogram(self):
+        return {
+            rating: getattr(self, f'rating_{rating}_count')
+            for rating in RATING_VALUES
+        }
+
+    @classmethod
+    def apply_rating(cls, book_id, rating, delta, trending=0.0):
+        rating_sum = F('rating_sum') + rating * delta
+        rating_count = F('rating_count') + delta
+        prior_rating, prior_weight = rating_prior()
+        cls.objects.filter(pk=book_id).update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            average_rating=Coalesce(
+                Cast(rating_sum, FloatField()) / NullIf(rating_count, 0),
+                0.0,
+            ),
+            # The WHEN sees the count before this update.
+            weighted_rating=Case(
+                When(
+                    rating_count__gt=-delta,
+                    then=(Value(prior_rating * prior_weight) + Cast(rating_sum, FloatField()))
+                    / (Value(prior_weight) + Cast(rating_count, FloatField())),
+                ),
+                default=Value(0.0),
+            ),
+            trending_score=F('trending_score') + trending,
+            **{f'rating_{rating}_count': F(f'rating_{rating}_count') + delta},
+        )
+
+    @classmethod
+    def rebuild_rating_aggregates(cls, book_ids=None, batch_size=1000):
+        books = cls.objects.all()
+        reviews = Review.objects.all()
+        if book_ids is not None:
+            books = books.filter(pk__in=book_ids)
+            reviews = reviews.filter(book_id__in=book_ids)
+
+        totals = reviews.order_by().values('book_id').annotate(
+            total=Sum('rating'),
+            count=Count('id'),
+            **{
+                f'count_{rating}': Count('id', filter=Q(rating=rating))
+                for rating in RATING_VALUES
+            },
+        )
+        fields = [
+            'average_rating',
+            'weighted_rating',
+            'rating_sum',
+            'rating_count',
+            *(f'rating_{rating}_count' for rating in RATING_VALUES),
+        ]
+
+        updated = 0
+        with transaction.atomic():
+            books.update(**{field: 0 for field in fields})
+            batch = []
+            for row in totals.iterator(chunk_size=batch_size):
+                book = cls(
+                    pk=row['book_id'],
+                    rating_sum=row['total'],
+                    rating_count=row['count'],
+                    average_rating=row['total'] / row['count'],
+                    weighted_rating=bayesian_rating(row['total'], row['count']),
+                )
+                for rating in RATING_VALUES:
+                    setattr(book, f'rating_{rating}_count', row[f'count_{rating}'])
+                batch.append(book)
+                if len(batch) >= batch_size:
+                    updated += len(batch)
+                    cls.objects.bulk_update(batch, fields)
+                    batch = []
+            if batch:
+                updated += len(batch)
+                cls.objects.bulk_update(batch, fields)
+        return updated
+
+    @classmethod
+    def apply_favourite(cls, book_id, delta, trending=0.0):
+        cls.objects.filter(pk=book_id).update(
+            favourites_count=F('favourites_count') + delta,
+            trending_score=F('trending_score') + trending,
+        )
+
+    @classmethod
+    def apply_trending(cls, weights):
+        # weights maps book ids to the trending terms to add, in one UPDATE.
+        if not weights:
+            return
+        cls.objects.filter(pk__in=weights).update(
+            trending_score=F('trending_score') + Case(
+                *(When(pk=book_id, then=Value(weight)) for book_id, weight in weights.items()),
+                default=Value(0.0),
+            ),
+        )
+
+    @classmethod
+    def rebuild_trending_scores(cls, book_ids=None, batch_size=1000):
+        books = cls.objects.all()
+        events = (
+            (Review.objects.all(), REVIEW_WEIGHT),
+            (FavoriteBook.objects.all(), FAVOURITE_WEIGHT),
+        )
+        if book_ids is not None:
+            books = books.filter(pk__in=book_ids)
+            events = [(rows.filter(book_id__in=book_ids), weight) for rows, weight in events]
+
+        scores = defaultdict(float)
+        for rows, weight in events:
+            for book_id, created_at in rows.values_list('book_id', 'created_at').iterator(chunk_size=batch_size):
+                scores[book_id] += trending_weight(created_at, weight)
+
+        with transaction.atomic():
+            books.update(trending_score=0)
+            cls.objects.bulk_update(
+                [cls(pk=book_id, trending_score=score) for book_id, score in scores.items()],
+                ['trending_score'],
+                batch_size=batch_size,
+            )
+        return len(scores)
+
+    @classmethod
+    def rebuild_favourites_count(cls, book_ids=None):
+        books = cls.objects.all()
+        if book_ids is not None:
+            books = books.filter(pk__in=book_ids)
+        favourites = FavoriteBook.objects.filter(
+            book=OuterRef('pk'),
+        ).order_by().values('book').annotate(count=Count('id')).values('count')
+        return books.update(
+            favourites_count=Coalesce(Subquery(favourites), 0),
+        )
 
     def __str__(self):
         return self.title
 
 
+class BookFacetCount(models.Model):
+    # Unfiltered facet counts of the book list: books per genre, author and
+    # publication year. Maintained by book.signals from Book snapshots and
+    # rebuilt by rebuild_book_aggregates and import_catalog.
+    GENRE = 'genre'
+    AUTHOR = 'author'
+    YEAR = 'year'
+    DIMENSION_CHOICES = (
+        (GENRE, 'Genre'),
+        (AUTHOR, 'Author'),
+        (YEAR, 'Publication year'),
+    )
+    BOOK_FIELDS = ('genre_id', 'author_id', 'publication_date')
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.IntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('dimension', 'key')
+        indexes = [
+            models.Index(fields=['dimension', '-count', 'key'], name='book_facet_count_idx'),
+        ]
+
+    @staticmethod
+    def key_expressions():
+        return {
+            BookFacetCount.GENRE: F('genre_id'),
+            BookFacetCount.AUTHOR: F('author_id'),
+            BookFacetCount.YEAR: ExtractYear('publication_date'),
+        }
+
+    @classmethod
+    def apply_book(cls, keys, delta):
+        # keys maps dimensions to the keys of one book, see Book.facet_keys.
+        if not keys:
+            return
+        condition = Q()
+        for dimension, key in keys.items():
+            condition |= Q(dimension=dimension, key=key)
+        updated = cls.objects.filter(condition).update(count=F('count') + delta)
+        if updated == len(keys) or delta < 0:
+            return
+
+        # First book of a genre, author or year. The rows are inserted empty
+        # and then incremented, so a concurrent insert of the same row is not
+        # lost.
+        existing = set(cls.objects.filter(condition).values_list('dimension', 'key'))
+        missing = [item for item in keys.items() if item not in existing]
+        cls.objects.bulk_create(
+            [cls(dimension=dimension, key=key) for dimension, key in missing],
+            ignore_conflicts=True,
+        )
+        condition = Q()
+        for dimension, key in missing:
+            condition |= Q(dimension=dimension, key=key)
+        cls.objects.filter(condition).update(count=F('count') + delta)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        books = Book.objects.order_by()
+        rows = [
+            cls(dimension=dimension, key=row['key'], count=row['count'])
+            for dimension, expression in cls.key_expressions().items()
+            for row in books.values(key=expression).annotate(count=Count('id'))
+        ]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=batch_size)
+        return len(rows)
+
+
 class Review(models.Model):
+    # The (book, id) and (user, id) indexes below replace the plain foreign
+    # key indexes.
     book = models.ForeignKey(
         Book,
         related_name='reviews',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     user = models.ForeignKey(
         User,
         related_name='reviews',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     rating = models.IntegerField(
         validators=[MinValueValidator(1), MaxValueValidator(5)]
     )
     comment = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Newest-first review pages of one book or one user, seeked by id.
+            models.Index(fields=['book', 'id'], name='review_book_id_idx'),
+            models.Index(fields=['user', 'id'], name='review_user_id_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        book_id = loaded.get('book_id', DEFERRED)
+        rating = loaded.get('rating', DEFERRED)
+        if book_id is not DEFERRED and rating is not DEFERRED:
+            instance._rating_snapshot = (book_id, rating)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Keeps the row and the book aggregates (see book.signals) in one
+        # transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Review by {self.user} for {self.book}"
@@ -94,9 +406,47 @@ class FavoriteBook(models.Model):
         related_name='favorited_by',
         on_delete=models.CASCADE,
     )
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         unique_together = ('user', 'book')
 
     def __str__(self):
         return self.user
+
+
+class BookRecommendation(models.Model):
+    # "Readers also favourited": the top-K most similar books of each book,
+    # written by the build_recommendations command (see book.recommendations).
+    book = models.ForeignKey(
+        Book,
+        related_name='recommendations',
+        on_delete=models.CASCADE,
+    )
+    recommended = models.ForeignKey(
+        Book,
+        related_name='recommended_for',
+        on_delete=models.CASCADE,
+    )
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('book', 'recommended')
+        indexes = [
+            models.Index(fields=['book', '-score', 'recommended'], name='book_recommendation_idx'),
+        ]
+
+
+class RecommendationBuild(models.Model):
+    # One row per build_recommendations run. The latest row holds the id
+    # watermarks an incremental run continues from.
+    created_at = models.DateTimeField(auto_now_add=True)
+    incremental = models.BooleanField(default=False)
+    include_reviews = models.BooleanField(default=False)
+    min_rating = models.PositiveSmallIntegerField(default=4)
+    top_k = models.PositiveSmallIntegerField()
+    min_common = models.PositiveIntegerField(default=1)
+    max_user_items = models.PositiveIntegerField(default=1000)
+    favourite_watermark = models.BigIntegerField(default=0)
+    review_watermark = models.BigIntegerField(default=0)
+    books_updated = models.PositiveIntegerField(default=0)
@@ -1,13 +1,166 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    page_size = 10
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.has_cursor = False
+        self.reverse = False
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            self.has_cursor = True
+            self.reverse, values = position
+            queryset = queryset.filter(self.get_position_filter(values))
+
+        order_by = [
+            ('-' if descending != self.reverse else '') + name
+            for name, descending in self.ordering
+        ]
+        results = list(queryset.order_by(*order_by)[:self.page_size + 1])
+        self.has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.first_item = results[0] if results else None
+        self.last_item = results[-1] if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def get_ordering(self, queryset):
+        model = queryset.model
+        ordering = list(queryset.query.order_by or model._meta.ordering or ())
+
+        fields = []
+        for item in ordering:
+            if not isinstance(item, str):
+                raise TypeError('Keyset pagination only supports ordering by field names.')
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            fields.append((field, descending))
+
+        if not fields or not fields[-1][0].primary_key:
+            descending = fields[-1][1] if fields else False
+            fields.append((model._meta.pk, descending))
+
+        self.fields = [field for field, _ in fields]
+        return [(field.name, descending) for field, descending in fields]
+
+    def get_position_filter(self, values):
+        position = Q()
+        equal = {}
+        for (name, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending != self.reverse else 'gt'
+            position |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+
+        # A leading inclusive bound lets the planner start an index range
+        # scan instead of evaluating the OR chain row by row.
+        name, descending = self.ordering[0]
+        lookup = 'lte' if descending != self.reverse else 'gte'
+        return Q(**{f'{name}__{lookup}': values[0]}) & position
+
+    def get_item_values(self, item):
+        if isinstance(item, dict):
+            # A values() row, keyed by field name.
+            return [item[field.name] for field in self.fields]
+        return [getattr(item, field.attname) for field in self.fields]
+
+    def get_next_link(self):
+        if self.last_item is None:
+            return None
+        if self.reverse or self.has_more:
+            return self.build_link(self.last_item, reverse=False)
+        return None
+
+    def get_previous_link(self):
+        if self.first_item is None:
+            return None
+        if (self.reverse and self.has_more) or (not self.reverse and self.has_cursor):
+            return self.build_link(self.first_item, reverse=True)
+        return None
+
+    def build_link(self, item, reverse):
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.get_item_values(item), reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def encode_cursor(self, values, reverse=False):
+        payload = json.dumps({'v': values, 'r': int(reverse)}, cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(encoded + padding))
+            values = payload['v']
+            if len(values) != len(self.fields):
+                raise ValueError
+            values = [
+                field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+            # None passes to_python but cannot be compared in the seek filter.
+            if None in values:
+                raise ValueError
+            return bool(payload['r']), values
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise ParseError(self.invalid_cursor_message)
 
 
 class CustomPagination(pagination.PageNumberPagination):
     page_size_query_param = 'limit'
     page_query_param = 'page'
     page_size = 10
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.mode_query_param and request.query_params.get(self.mode_query_param) == 'cursor':
+            self.keyset = self.keyset_class()
+            self.keyset.page_size = self.page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
 
     def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
         return Response({
             'page': self.page.number,
             'count': self.page.paginator.count,
@@ -15,3 +168,8 @@ class CustomPagination(pagination.PageNumberPagination):
             'previous': self.get_previous_link(),
             'results': data,
         })
+
+
+class SearchPagination(CustomPagination):
+    # Search hits are ranked by relevance, which has no keyset to seek on.
+    mode_query_param = None
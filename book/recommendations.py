@@ -0,0 +1,191 @@
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from book.cache import CATALOG, invalidate
+from book.models import (
+    BookRecommendation,
+    FavoriteBook,
+    RecommendationBuild,
+    Review,
+)
+
+INTERACTION_DTYPE = [('id', np.int64), ('user', np.int64), ('book', np.int64)]
+
+
+def load_interactions(queryset, chunk_size):
+    rows = queryset.order_by().values_list('id', 'user_id', 'book_id').iterator(chunk_size=chunk_size)
+    return np.fromiter(rows, dtype=INTERACTION_DTYPE)
+
+
+class RecommendationBuilder:
+    """
+    Item-to-item cosine similarity over the binary user x book matrix of
+    favourites and, optionally, reviews rated at least min_rating.
+
+    Co-occurrence counts come from sparse products of the book x user matrix
+    with the user x book matrix, computed for a block of books at a time so
+    memory stays bounded by the block. The top-K neighbours of a whole block
+    are picked with one lexsort instead of a Python loop per book.
+    """
+
+    # Incremental runs re-read this many ids below the watermarks to catch
+    # interactions that committed out of id order.
+    overlap = 1000
+
+    def __init__(self, top_k=50, include_reviews=False, min_rating=4, min_common=1,
+                 max_user_items=1000, block_size=2000, chunk_size=20000, log=None):
+        self.top_k = top_k
+        self.include_reviews = include_reviews
+        self.min_rating = min_rating
+        self.min_common = min_common
+        self.max_user_items = max_user_items
+        self.block_size = block_size
+        self.chunk_size = chunk_size
+        self.log = log or (lambda message: None)
+
+    def options(self):
+        return {
+            'include_reviews': self.include_reviews,
+            'min_rating': self.min_rating,
+            'top_k': self.top_k,
+            'min_common': self.min_common,
+            'max_user_items': self.max_user_items,
+        }
+
+    def build(self, incremental=False):
+        previous = RecommendationBuild.objects.order_by('-id').first()
+        options = self.options()
+        if incremental and (
+            previous is None
+            or {name: getattr(previous, name) for name in options} != options
+        ):
+            self.log('No previous build with the same settings, running a full build.')
+            incremental = False
+
+        if incremental and not self.has_new_interactions(previous):
+            # Nothing to recompute, so nothing worth loading.
+            self.log(f'No new interactions since build {previous.pk}.')
+            return RecommendationBuild.objects.create(
+                incremental=True,
+                favourite_watermark=previous.favourite_watermark,
+                review_watermark=previous.review_watermark,
+                **options,
+            )
+
+        favourites = load_interactions(FavoriteBook.objects.all(), self.chunk_size)
+        reviews = np.empty(0, dtype=INTERACTION_DTYPE)
+        if self.include_reviews:
+            reviews = load_interactions(self.reviews(), self.chunk_size)
+        self.log(f'Loaded {len(favourites)} favourites and {len(reviews)} reviews.')
+
+        matrix, _, book_ids = self.interaction_matrix(favourites, reviews)
+        if incremental:
+            targets = self.affected_books(matrix, book_ids, favourites, reviews, previous)
+            self.log(f'{len(targets)} books affected since build {previous.pk}.')
+        else:
+            targets = np.arange(len(book_ids))
+
+        updated = self.write(matrix, book_ids, targets)
+        if not incremental:
+            self.remove_stale(book_ids)
+        invalidate(CATALOG)
+
+        return RecommendationBuild.objects.create(
+            incremental=incremental,
+            favourite_watermark=self.watermark(favourites, previous and previous.favourite_watermark),
+            review_watermark=self.watermark(reviews, previous and previous.review_watermark),
+            books_updated=updated,
+            **options,
+        )
+
+    def reviews(self):
+        return Review.objects.filter(rating__gte=self.min_rating)
+
+    def has_new_interactions(self, previous):
+        if FavoriteBook.objects.filter(id__gt=previous.favourite_watermark).exists():
+            return True
+        return self.include_reviews and self.reviews().filter(id__gt=previous.review_watermark).exists()
+
+    def watermark(self, interactions, previous):
+        return max(int(interactions['id'].max()) if len(interactions) else 0, previous or 0)
+
+    def interaction_matrix(self, favourites, reviews):
+        users = np.concatenate([favourites['user'], reviews['user']])
+        books = np.concatenate([favourites['book'], reviews['book']])
+        user_ids, user_index = np.unique(users, return_inverse=True)
+        book_ids, book_index = np.unique(books, return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(users), dtype=np.float32), (user_index, book_index)),
+            shape=(len(user_ids), len(book_ids)),
+        )
+        # A review and a favourite of the same book count once.
+        matrix.data[:] = 1
+
+        if self.max_user_items:
+            # Users with huge histories (imports, bots) cost the square of
+            # their size in the product and say little about any pair.
+            keep = np.diff(matrix.indptr) <= self.max_user_items
+            matrix = matrix[keep]
+            user_ids = user_ids[keep]
+        return matrix, user_ids, book_ids
+
+    def affected_books(self, matrix, book_ids, favourites, reviews, previous):
+        # A new reader of book B changes B's norm and its co-occurrences, so
+        # the score of B against every book sharing a reader with it. B and
+        # all books co-read with it are recomputed; their readers come from
+        # one more sparse product. Other books keep exact lists. Removed
+        # interactions, and users who grew past max_user_items, are only
+        # picked up by the next full build.
+        touched = np.searchsorted(book_ids, np.unique(np.concatenate([
+            favourites['book'][favourites['id'] > previous.favourite_watermark - self.overlap],
+            reviews['book'][reviews['id'] > previous.review_watermark - self.overlap],
+        ])))
+        selected = np.zeros(len(book_ids), dtype=np.float32)
+        selected[touched] = 1
+        readers = np.flatnonzero(matrix @ selected)
+        return np.union1d(touched, matrix[readers].indices)
+
+    def write(self, matrix, book_ids, targets):
+        item_matrix = matrix.T.tocsr()
+        norms = np.sqrt(np.diff(item_matrix.indptr).astype(np.float64))
+        updated = 0
+        for start in range(0, len(targets), self.block_size):
+            rows = targets[start:start + self.block_size]
+            common = (item_matrix[rows] @ matrix).tocoo()
+            row, column, count = common.row, common.col, common.data
+            keep = (column != rows[row]) & (count >= self.min_common)
+            row, column, count = row[keep], column[keep], count[keep]
+            # Rounded so that equal similarities tie exactly and are ordered
+            # by book id whatever the float error of their fractions.
+            scores = np.round(count / (norms[rows[row]] * norms[column]), 9)
+
+            # Best first within each book; a neighbour's rank is its offset
+            # from the first entry of its book.
+            order = np.lexsort((column, -scores, row))
+            row, column, scores = row[order], column[order], scores[order]
+            keep = np.arange(len(row)) - np.searchsorted(row, row) < self.top_k
+            row, column, scores = row[keep], column[keep], scores[keep]
+
+            self.save_block(book_ids[rows], book_ids[rows[row]], book_ids[column], scores)
+            updated += len(rows)
+            self.log(f'{updated}/{len(targets)} books')
+        return updated
+
+    def save_block(self, block_book_ids, sources, targets, scores):
+        with transaction.atomic():
+            BookRecommendation.objects.filter(book_id__in=block_book_ids.tolist()).delete()
+            BookRecommendation.objects.bulk_create([
+                BookRecommendation(book_id=source, recommended_id=target, score=score)
+                for source, target, score in zip(sources.tolist(), targets.tolist(), scores.tolist())
+            ], batch_size=5000)
+
+    def remove_stale(self, book_ids):
+        # Books that lost all their readers.
+        current = set(book_ids.tolist())
+        stale = [
+            book_id for book_id in BookRecommendation.objects.order_by().values_list('book_id', flat=True).distinct()
+            if book_id not in current
+        ]
+        for start in range(0, len(stale), self.block_size):
+            BookRecommendation.objects.filter(book_id__in=stale[start:start + self.block_size]).delete()
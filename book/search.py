@@ -0,0 +1,234 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+SEARCH_TABLE = 'book_search_index'
+SEARCH_CONFIG = 'simple'
+
+
+class PostgresSearchBackend:
+    # book_search_index(book_id, document tsvector) with a GIN index on
+    # document, created by migration 0005.
+    document_sql = (
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', b.title), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', a.name), 'B') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', b.description), 'C')"
+    )
+    query_sql = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+
+    def update(self, where='', params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (book_id, document) '
+                f'SELECT b.id, {self.document_sql} '
+                'FROM book_book b JOIN book_author a ON a.id = b.author_id '
+                f'{where} '
+                'ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document',
+                params,
+            )
+
+    def remove(self, book_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE book_id = ANY(%s)',
+                [list(book_ids)],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {SEARCH_TABLE}')
+
+    def count(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {SEARCH_TABLE} '
+                f'WHERE document @@ {self.query_sql}',
+                [query],
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, query, limit, offset):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT book_id FROM {SEARCH_TABLE}, {self.query_sql} q '
+                'WHERE document @@ q '
+                'ORDER BY ts_rank_cd(document, q) DESC, book_id '
+                'LIMIT %s OFFSET %s',
+                [query, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class SQLiteSearchBackend:
+    # book_search_index is an FTS5 table whose rowid is the book id.
+    def update(self, where='', params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN '
+                f'(SELECT b.id FROM book_book b {where})',
+                params,
+            )
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, title, author, description) '
+                'SELECT b.id, b.title, a.name, b.description '
+                'FROM book_book b JOIN book_author a ON a.id = b.author_id '
+                f'{where}',
+                params,
+            )
+
+    def remove(self, book_ids):
+        book_ids = list(book_ids)
+        placeholders = ', '.join(['%s'] * len(book_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+                book_ids,
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    def match_expression(self, query):
+        # The websearch_to_tsquery syntax of the PostgreSQL backend: words
+        # are ANDed, "quoted words" form a phrase, or between words is an
+        # alternative and a leading - excludes a word or phrase. Words are
+        # emitted as quoted FTS5 strings, so nothing else in the input is
+        # parsed as FTS5 syntax. FTS5 has no unary NOT, so an alternative
+        # made only of exclusions matches nothing instead of everything.
+        groups = [([], [])]
+        for negated, phrase, word in re.findall(r'(-?)(?:"([^"]*)"?|([^\s"]+))', query):
+            if not negated and word.lower() == 'or':
+                groups.append(([], []))
+                continue
+            terms = re.findall(r'\w+', phrase or word)
+            if terms:
+                groups[-1][bool(negated)].append('"{}"'.format(' '.join(terms)))
+
+        alternatives = [
+            ' '.join(included) + ''.join(f' NOT {term}' for term in excluded)
+            for included, excluded in groups
+            if included
+        ]
+        if len(alternatives) > 1:
+            return ' OR '.join(f'({alternative})' for alternative in alternatives)
+        return ''.join(alternatives)
+
+    def count(self, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+                [expression],
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, query, limit, offset):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                f'ORDER BY bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0), rowid '
+                'LIMIT %s OFFSET %s',
+                [expression, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackSearchBackend:
+    # Unindexed substring matching for database backends without a
+    # full-text index.
+    def update(self, where='', params=()):
+        pass
+
+    def remove(self, book_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def get_queryset(self, query):
+        from book.models import Book
+
+        return Book.objects.filter(
+            Q(title__icontains=query)
+            | Q(description__icontains=query)
+            | Q(author__name__icontains=query)
+        ).order_by('id')
+
+    def count(self, query):
+        return self.get_queryset(query).count()
+
+    def search(self, query, limit, offset):
+        return list(
+            self.get_queryset(query).values_list('id', flat=True)[offset:offset + limit]
+        )
+
+
+def get_search_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    return FallbackSearchBackend()
+
+
+def index_books(book_ids):
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    get_search_backend().update(f'WHERE b.id IN ({placeholders})', book_ids)
+
+
+def index_author_books(author_id):
+    get_search_backend().update('WHERE b.author_id = %s', [author_id])
+
+
+def remove_books(book_ids):
+    book_ids = list(book_ids)
+    if book_ids:
+        get_search_backend().remove(book_ids)
+
+
+def rebuild_search_index():
+    backend = get_search_backend()
+    backend.clear()
+    backend.update()
+
+
+class SearchResults:
+    # Lazy, sliceable sequence of ranked hits for Django's Paginator: the
+    # count and every page are index queries, and the books of a page are
+    # loaded with a single in_bulk() call.
+    def __init__(self, query, queryset):
+        self.query = query
+        self.queryset = queryset
+        self.backend = get_search_backend()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query) if self.query else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+
+        offset = item.start or 0
+        limit = (item.stop if item.stop is not None else self.count()) - offset
+        if not self.query or limit <= 0:
+            return []
+
+        book_ids = self.backend.search(self.query, limit, offset)
+        books = self.queryset.in_bulk(book_ids)
+        return [books[book_id] for book_id in book_ids if book_id in books]
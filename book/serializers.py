@@ -1,10 +1,15 @@
+from django.urls import reverse
 from rest_framework import serializers
+from rest_framework.utils.urls import replace_query_param
 from book.models import (
     Book,
     Genre,
     Author,
     Review,
+    FavoriteBook,
 )
+from book.leaderboards import decayed_trending_score
+from book.pagination import CustomPagination, KeysetPagination
 from authentication.models import User
 
 
@@ -24,6 +29,12 @@ class BookSerializer(serializers.ModelSerializer):
     genre = GenreSerializer(read_only=True)
     author = AuthorSerializer(read_only=True)
     average_rating = serializers.SerializerMethodField()
+    # Documents the flag added by with_favorite_flags; Book has no such
+    # attribute, so the field itself is skipped when serializing.
+    is_favorited = serializers.BooleanField(
+        read_only=True,
+        help_text='Книга в избранном у текущего пользователя. Только для авторизованных запросов.',
+    )
 
     class Meta:
         model = Book
@@ -33,10 +44,97 @@ class BookSerializer(serializers.ModelSerializer):
             "genre",
             "author",
             "average_rating",
+            "is_favorited",
         ]
 
     def get_average_rating(self, obj):
-        return obj.average_rating
+        return round(obj.average_rating, 2)
+
+    @staticmethod
+    def with_favorite_flags(items, user):
+        # is_favorited is per user, so it is added to already serialized (and
+        # possibly shared, cached) items as copies, with one query per page.
+        favorited = set(FavoriteBook.objects.filter(
+            user=user,
+            book_id__in=[item['id'] for item in items],
+        ).values_list('book_id', flat=True))
+        return [
+            {**item, 'is_favorited': item['id'] in favorited}
+            for item in items
+        ]
+
+
+class BookListSerializer(serializers.BaseSerializer):
+    # Read-only fast path for the book lists: renders rows of
+    # Book.objects.values(*values_fields), with genre and author joined in the
+    # same query, into exactly the JSON of BookSerializer without the per-field
+    # serializer dispatch. The extra ordering columns are selected for keyset
+    # cursors and not rendered.
+    values_fields = (
+        'id',
+        'title',
+        'genre__name',
+        'author__name',
+        'average_rating',
+        'rating_count',
+        'publication_date',
+        'favourites_count',
+    )
+
+    @classmethod
+    def rows(cls, queryset):
+        return queryset.values(*cls.values_fields)
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'genre': {'name': row['genre__name']},
+            'author': {'name': row['author__name']},
+            'average_rating': round(row['average_rating'], 2),
+        }
+
+
+class LeaderboardSerializer(BookListSerializer):
+    # BookListSerializer rows plus the score of the board they are ranked on;
+    # trending scores are decayed to the context's now.
+    values_fields = BookListSerializer.values_fields + ('weighted_rating', 'trending_score')
+
+    def to_representation(self, row):
+        data = super().to_representation(row)
+        if self.context.get('board') == 'trending':
+            data['score'] = round(decayed_trending_score(row['trending_score'], self.context.get('now')), 3)
+        else:
+            data['score'] = round(row['weighted_rating'], 2)
+        return data
+
+
+class RecommendedBookSerializer(BookListSerializer):
+    # BookListSerializer rows of recommended books with their similarity.
+    values_fields = BookListSerializer.values_fields + ('score',)
+
+    def to_representation(self, row):
+        data = super().to_representation(row)
+        data['score'] = round(row['score'], 3)
+        return data
+
+
+class ScoredBookSerializer(BookSerializer):
+    # API schema of the LeaderboardSerializer and RecommendedBookSerializer
+    # rows; not used to render them.
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + ['score']
+
+
+class LeaderboardResponseSerializer(serializers.Serializer):
+    board = serializers.CharField()
+    results = ScoredBookSerializer(many=True)
+
+
+class RecommendationResponseSerializer(serializers.Serializer):
+    results = ScoredBookSerializer(many=True)
 
 
 class ReviewByUserSerializer(serializers.ModelSerializer):
@@ -58,13 +156,36 @@ class ReviewDetailSerializer(serializers.ModelSerializer):
 
 
 class BookDetailSerializer(BookSerializer):
-    reviews = ReviewDetailSerializer(many=True, read_only=True)
+    # Only the newest reviews are embedded; reviews_next points to the
+    # per-book review listing for the rest.
+    reviews_limit = 5
+
+    reviews_count = serializers.IntegerField(source='rating_count', read_only=True)
+    reviews = serializers.SerializerMethodField()
+    reviews_next = serializers.SerializerMethodField()
 
     class Meta(BookSerializer.Meta):
         fields = BookSerializer.Meta.fields + [
-            'description', 'publication_date', 'reviews'
+            'description', 'publication_date', 'reviews_count', 'reviews', 'reviews_next'
         ]
 
+    def get_reviews(self, obj):
+        reviews = obj.latest_reviews[:self.reviews_limit]
+        return ReviewDetailSerializer(reviews, many=True, context=self.context).data
+
+    def get_reviews_next(self, obj):
+        if len(obj.latest_reviews) <= self.reviews_limit:
+            return None
+
+        last_review = obj.latest_reviews[self.reviews_limit - 1]
+        url = reverse('book-review-list', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        cursor = KeysetPagination().encode_cursor([last_review.pk])
+        url = replace_query_param(url, CustomPagination.mode_query_param, 'cursor')
+        return replace_query_param(url, KeysetPagination.cursor_query_param, cursor)
+
 
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
@@ -75,3 +196,29 @@ class ReviewSerializer(serializers.ModelSerializer):
             "rating",
             "comment",
         ]
+
+
+class ReviewListSerializer(serializers.BaseSerializer):
+    # Read-only fast path with the JSON of ReviewSerializer, from
+    # Review.objects.values(*values_fields) rows.
+    values_fields = ('id', 'book', 'user', 'rating', 'comment')
+
+    @classmethod
+    def rows(cls, queryset):
+        return queryset.values(*cls.values_fields)
+
+    def to_representation(self, row):
+        return {
+            'book': row['book'],
+            'user': row['user'],
+            'rating': row['rating'],
+            'comment': row['comment'],
+        }
+
+
+class FavoriteBooksBatchSerializer(serializers.Serializer):
+    book_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=500,
+    )
@@ -0,0 +1,153 @@
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from book.cache import (
+    ALL_BOOKS,
+    CATALOG,
+    book_namespace,
+    invalidate,
+)
+from book.models import (
+    Author,
+    Book,
+    BookFacetCount,
+    Genre,
+    Review,
+    FavoriteBook,
+)
+from book.leaderboards import (
+    FAVOURITE_WEIGHT,
+    REVIEW_WEIGHT,
+    trending_weight,
+)
+from book.search import (
+    index_author_books,
+    index_books,
+    remove_books,
+)
+
+
+# Registered before the rating receivers, which overwrite _rating_snapshot.
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_cache(sender, instance, **kwargs):
+    book_ids = {instance.book_id}
+    previous = getattr(instance, '_rating_snapshot', None)
+    if previous is not None:
+        book_ids.add(previous[0])
+    invalidate(CATALOG, *(book_namespace(book_id) for book_id in book_ids))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    invalidate(CATALOG, book_namespace(instance.pk))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_taxonomy_cache(sender, instance, **kwargs):
+    invalidate(CATALOG, ALL_BOOKS)
+
+
+@receiver(post_save, sender=FavoriteBook)
+@receiver(post_delete, sender=FavoriteBook)
+def invalidate_favourite_cache(sender, instance, **kwargs):
+    # Favourites are not part of any cached payload, but they change the
+    # favourites_count ordering of the list.
+    invalidate(CATALOG)
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+
+    current = (instance.book_id, instance.rating)
+    previous = getattr(instance, '_rating_snapshot', None)
+    trending = trending_weight(instance.created_at, REVIEW_WEIGHT)
+    if created:
+        Book.apply_rating(instance.book_id, instance.rating, 1, trending=trending)
+    elif previous is None:
+        # The old values are unknown, so recount the book from scratch.
+        Book.rebuild_rating_aggregates(book_ids=[instance.book_id])
+        Book.rebuild_trending_scores(book_ids=[instance.book_id])
+    elif previous != current:
+        # The activity only moves when the review moves to another book.
+        moved = trending if previous[0] != current[0] else 0.0
+        Book.apply_rating(*previous, -1, trending=-moved)
+        Book.apply_rating(*current, 1, trending=moved)
+    instance._rating_snapshot = current
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, **kwargs):
+    previous = getattr(instance, '_rating_snapshot', None)
+    book_id, rating = previous or (instance.book_id, instance.rating)
+    Book.apply_rating(book_id, rating, -1, trending=-trending_weight(instance.created_at, REVIEW_WEIGHT))
+
+
+@receiver(post_save, sender=FavoriteBook)
+def update_favourites_on_save(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        Book.apply_favourite(
+            instance.book_id, 1, trending=trending_weight(instance.created_at, FAVOURITE_WEIGHT),
+        )
+
+
+@receiver(post_delete, sender=FavoriteBook)
+def update_favourites_on_delete(sender, instance, **kwargs):
+    Book.apply_favourite(
+        instance.book_id, -1, trending=-trending_weight(instance.created_at, FAVOURITE_WEIGHT),
+    )
+
+
+@receiver(post_save, sender=Book)
+def update_facets_on_book_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+
+    current = instance.facet_keys
+    # Book.save() takes the snapshot of every existing row it updates.
+    previous = getattr(instance, '_facet_snapshot', None)
+    if created or previous is None:
+        BookFacetCount.apply_book(current, 1)
+    elif previous != current:
+        changed = [dimension for dimension in current if previous[dimension] != current[dimension]]
+        BookFacetCount.apply_book({dimension: previous[dimension] for dimension in changed}, -1)
+        BookFacetCount.apply_book({dimension: current[dimension] for dimension in changed}, 1)
+    instance._facet_snapshot = current
+
+
+@receiver(pre_delete, sender=Book)
+def snapshot_facets_on_book_delete(sender, instance, **kwargs):
+    instance.load_facet_snapshot()
+
+
+@receiver(post_delete, sender=Book)
+def update_facets_on_book_delete(sender, instance, **kwargs):
+    previous = getattr(instance, '_facet_snapshot', None)
+    if previous is not None:
+        BookFacetCount.apply_book(previous, -1)
+
+
+@receiver(post_save, sender=Book)
+def index_book_on_save(sender, instance, raw, **kwargs):
+    if not raw:
+        index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def remove_book_from_index(sender, instance, **kwargs):
+    remove_books([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def reindex_author_books(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        index_author_books(instance.pk)
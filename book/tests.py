@@ -1,3 +1,1095 @@
+import base64
+import datetime
+import io
+import itertools
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authentication.models import User
+from book.filters import BookFilter
+from book.leaderboards import FAVOURITE_WEIGHT, bayesian_rating, trending_weight
+from book.models import (
+    Author,
+    Book,
+    BookFacetCount,
+    BookRecommendation,
+    FavoriteBook,
+    Genre,
+    Review,
+)
+from book.recommendations import RecommendationBuilder
+from book.serializers import (
+    BookListSerializer,
+    BookSerializer,
+    ReviewListSerializer,
+    ReviewSerializer,
+    ScoredBookSerializer,
+)
+
+FILTER_PARAMS = {
+    'genre_name': 'GENRE 3',
+    'author_name': 'author 23',
+    'publication_date_after': '1950-01-01',
+    'publication_date_before': '1951-01-01',
+}
+FILTERED_TABLES = ('book_book', 'book_genre', 'book_author')
+
+
+class BookFilterQueryPlanTests(TestCase):
+    # Every combination of BookFilter parameters must be answered from an
+    # index. Plans are checked on the unordered filter queryset, which is
+    # also what the list count runs.
+
+    @classmethod
+    def setUpTestData(cls):
+        genres = Genre.objects.bulk_create([Genre(name=f'Genre {i}') for i in range(20)])
+        authors = Author.objects.bulk_create([Author(name=f'Author {i}') for i in range(100)])
+        start = datetime.date(1900, 1, 1)
+        Book.objects.bulk_create([
+            Book(
+                title=f'Book {i}',
+                description='',
+                genre=genres[i % len(genres)],
+                author=authors[i % len(authors)],
+                publication_date=start + datetime.timedelta(days=i * 13),
+            )
+            for i in range(2000)
+        ])
+
+    def get_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}', params)
+                return [row[0] for row in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_no_full_scan(self, plan):
+        for line in plan:
+            if connection.vendor == 'postgresql':
+                self.assertNotIn('Seq Scan', line, '\n'.join(plan))
+            else:
+                for table in FILTERED_TABLES:
+                    self.assertFalse(line.startswith(f'SCAN {table}'), '\n'.join(plan))
+
+    def test_filter_combinations_use_indexes(self):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            self.skipTest('Query plan checks are written for PostgreSQL and SQLite.')
+
+        for size in range(1, len(FILTER_PARAMS) + 1):
+            for names in itertools.combinations(FILTER_PARAMS, size):
+                params = {name: FILTER_PARAMS[name] for name in names}
+                with self.subTest(params=params):
+                    book_filter = BookFilter(params, Book.objects.all())
+                    queryset = book_filter.qs.order_by()
+                    self.assertTrue(queryset.exists())
+                    self.assert_no_full_scan(self.get_plan(queryset))
+
+
+class BookExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        genre = Genre.objects.create(name='Genre')
+        author = Author.objects.create(name='Author')
+        Book.objects.bulk_create([
+            Book(
+                title=f'Book {i}',
+                description='',
+                genre=genre,
+                author=author,
+                publication_date=datetime.date(2000, 1, 1 + i),
+            )
+            for i in range(3)
+        ])
+
+    def test_exports_filtered_rows(self):
+        response = self.client.get(reverse('book-export'), {'publication_date_after': '2000-01-02'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+
+    def test_invalid_filter_is_rejected_before_streaming(self):
+        response = self.client.get(reverse('book-export'), {'publication_date_after': 'not-a-date'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+
+
+def create_books(count, genre=None, author=None, **fields):
+    genre = genre or Genre.objects.create(name='Genre')
+    author = author or Author.objects.create(name='Author')
+    return [
+        Book.objects.create(
+            title=f'Book {i}',
+            description='',
+            genre=genre,
+            author=author,
+            publication_date=datetime.date(2000, 1, 1),
+            **fields,
+        )
+        for i in range(count)
+    ]
+
+
+def create_users(count):
+    return [
+        User.objects.create_user(email=f'reader{i}@example.com')
+        for i in range(count)
+    ]
+
+
+class BookRatingAggregateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book, cls.other_book = create_books(2)
+        cls.users = create_users(3)
+
+    def assert_aggregates(self, book):
+        book.refresh_from_db()
+        totals = Review.objects.filter(book=book).aggregate(total=Sum('rating'), count=Count('id'))
+        total, count = totals['total'] or 0, totals['count']
+        self.assertEqual(book.rating_sum, total)
+        self.assertEqual(book.rating_count, count)
+        self.assertAlmostEqual(book.average_rating, total / count if count else 0)
+        self.assertAlmostEqual(book.weighted_rating, bayesian_rating(total, count))
+        self.assertEqual(book.rating_histogram, {
+            rating: Review.objects.filter(book=book, rating=rating).count()
+            for rating in range(1, 6)
+        })
+
+    def create_review(self, user, rating, book=None):
+        return Review.objects.create(book=book or self.book, user=user, rating=rating, comment='')
+
+    def test_create(self):
+        self.create_review(self.users[0], 5)
+        self.create_review(self.users[1], 2)
+        self.assert_aggregates(self.book)
+        self.assertEqual(self.book.rating_count, 2)
+
+    def test_rating_change(self):
+        review = self.create_review(self.users[0], 5)
+        self.create_review(self.users[1], 3)
+        review.rating = 1
+        review.save()
+        self.assert_aggregates(self.book)
+
+        # Loaded from the database rather than kept from create().
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 4
+        review.save()
+        self.assert_aggregates(self.book)
+
+    def test_move_to_another_book(self):
+        review = self.create_review(self.users[0], 4)
+        self.create_review(self.users[1], 2)
+        self.create_review(self.users[2], 5, book=self.other_book)
+        review = Review.objects.get(pk=review.pk)
+        review.book = self.other_book
+        review.rating = 3
+        review.save()
+        self.assert_aggregates(self.book)
+        self.assert_aggregates(self.other_book)
+
+    def test_delete(self):
+        review = self.create_review(self.users[0], 4)
+        self.create_review(self.users[1], 1)
+        review.delete()
+        self.assert_aggregates(self.book)
+        Review.objects.get().delete()
+        self.assert_aggregates(self.book)
+        self.assertEqual(self.book.average_rating, 0)
+        self.assertEqual(self.book.weighted_rating, 0)
+
+    def test_rebuild_command(self):
+        self.create_review(self.users[0], 4)
+        self.create_review(self.users[1], 1)
+        self.create_review(self.users[2], 5, book=self.other_book)
+        Book.objects.update(
+            rating_sum=0, rating_count=7, average_rating=3, weighted_rating=1, rating_4_count=3,
+        )
+        call_command('rebuild_book_aggregates', stdout=io.StringIO())
+        self.assert_aggregates(self.book)
+        self.assert_aggregates(self.other_book)
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Few distinct ratings and dates, so most pages end inside a run of
+        # equal ordering values.
+        genre = Genre.objects.create(name='Genre')
+        author = Author.objects.create(name='Author')
+        Book.objects.bulk_create([
+            Book(
+                title=f'Book {i % 4}',
+                description='',
+                genre=genre,
+                author=author,
+                publication_date=datetime.date(2000, 1, 1 + i % 2),
+                average_rating=i % 3,
+            )
+            for i in range(23)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk(self, params):
+        pages = []
+        data = self.get(reverse('book-list'), {'pagination': 'cursor', 'limit': 5, **params})
+        pages.append(data)
+        while data['next']:
+            data = self.get(data['next'])
+            pages.append(data)
+        return pages
+
+    def expected_ids(self, ordering):
+        return list(Book.objects.order_by(*ordering).values_list('id', flat=True))
+
+    def test_walks_every_row_once(self):
+        cases = (
+            ({}, ('id',)),
+            ({'ordering': 'average_rating'}, ('average_rating', 'id')),
+            ({'ordering': '-average_rating'}, ('-average_rating', '-id')),
+            ({'ordering': 'title,-publication_date'}, ('title', '-publication_date', '-id')),
+        )
+        for params, ordering in cases:
+            with self.subTest(params=params):
+                pages = self.walk(params)
+                ids = [item['id'] for page in pages for item in page['results']]
+                self.assertEqual(ids, self.expected_ids(ordering))
+                self.assertEqual([len(page['results']) for page in pages], [5, 5, 5, 5, 3])
+
+    def test_previous_links(self):
+        pages = self.walk({'ordering': '-average_rating'})
+        self.assertIsNone(pages[0]['previous'])
+        self.assertIsNone(pages[-1]['next'])
+
+        # Walking back from the last page returns the same pages.
+        data = pages[-1]
+        for page in reversed(pages[:-1]):
+            data = self.get(data['previous'])
+            self.assertEqual(data['results'], page['results'])
+            self.assertIsNotNone(data['next'])
+        self.assertIsNone(data['previous'])
+
+        # And forward again from a page reached backwards.
+        self.assertEqual(self.get(data['next'])['results'], pages[1]['results'])
+
+    def test_invalid_cursor(self):
+        def encode(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        cursors = (
+            'not a cursor',
+            encode([1, 2]),
+            encode({'v': [1], 'r': 0}),
+            encode({'v': [None, None], 'r': 0}),
+            encode({'v': ['high', 1], 'r': 0}),
+            encode({'v': [1.5, 'x'], 'r': 0}),
+            encode({'v': [1.5, 3]}),
+        )
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('book-list'), {
+                    'pagination': 'cursor',
+                    'ordering': 'average_rating',
+                    'cursor': cursor,
+                })
+                self.assertEqual(response.status_code, 400)
+
+
+class ReviewListingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = create_books(2)
+        cls.users = create_users(3)
+        # Interleaved, so neither filter matches a contiguous run of ids.
+        for i in range(24):
+            Review.objects.create(
+                book=cls.books[i % 2], user=cls.users[i % 3], rating=i % 5 + 1, comment=f'Review {i}',
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url, params):
+        response = self.client.get(url, {'pagination': 'cursor', 'limit': 3, **params})
+        pages = [response.json()]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).json())
+        return [item for page in pages for item in page['results']]
+
+    def expected(self, **filters):
+        return list(Review.objects.filter(**filters).order_by('-id'))
+
+    def test_review_list_filters(self):
+        book, user = self.books[0], self.users[1]
+        cases = (
+            ({'book': book.pk}, {'book': book}),
+            ({'user': user.pk}, {'user': user}),
+            ({'book': book.pk, 'user': user.pk}, {'book': book, 'user': user}),
+        )
+        for params, filters in cases:
+            with self.subTest(params=params):
+                items = self.walk(reverse('review-list'), params)
+                self.assertEqual(
+                    [(item['book'], item['user'], item['comment']) for item in items],
+                    [(review.book_id, review.user_id, review.comment) for review in self.expected(**filters)],
+                )
+
+    def test_book_review_list_matches_review_list(self):
+        book, user = self.books[1], self.users[2]
+        for params, filters in (({}, {}), ({'user': user.pk}, {'user': user})):
+            with self.subTest(params=params):
+                items = self.walk(reverse('book-review-list', kwargs={'pk': book.pk}), params)
+                self.assertEqual(
+                    [(item['user']['email'], item['comment']) for item in items],
+                    [(review.user.email, review.comment) for review in self.expected(book=book, **filters)],
+                )
+                self.assertEqual(
+                    [item['comment'] for item in items],
+                    [item['comment'] for item in self.walk(reverse('review-list'), {'book': book.pk, **params})],
+                )
+
+        # The path wins over a book in the query string.
+        response = self.client.get(
+            reverse('book-review-list', kwargs={'pk': book.pk}), {'book': self.books[0].pk},
+        )
+        self.assertEqual(response.json()['count'], 12)
+        self.assertEqual(
+            [item['comment'] for item in response.json()['results']],
+            [review.comment for review in self.expected(book=book)[:10]],
+        )
+
+    def test_detail_links_to_remaining_reviews(self):
+        book = self.books[0]
+        detail = self.client.get(reverse('book-detail', kwargs={'pk': book.pk})).json()
+        items = [review['comment'] for review in detail['reviews']]
+        response = self.client.get(detail['reviews_next'])
+        while True:
+            data = response.json()
+            items += [review['comment'] for review in data['results']]
+            if not data['next']:
+                break
+            response = self.client.get(data['next'])
+        self.assertEqual(items, [review.comment for review in self.expected(book=book)])
+
+
+class ListSerializerParityTests(TestCase):
+    # The values() fast paths must render exactly the ModelSerializer JSON,
+    # key order included.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = create_books(2, genre=Genre.objects.create(name=''), author=Author.objects.create(name='Лев Толстой'))
+        cls.books += create_books(1)
+        cls.users = create_users(3)
+        for user, rating in zip(cls.users, (5, 3, 2)):
+            Review.objects.create(book=cls.books[0], user=user, rating=rating, comment='')
+        Review.objects.create(book=cls.books[2], user=cls.users[0], rating=4, comment='Ёмкий «отзыв»\n')
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_book_list_serializer(self):
+        queryset = Book.objects.order_by('id')
+        self.assertEqual(
+            self.render(BookListSerializer(BookListSerializer.rows(queryset), many=True).data),
+            self.render(BookSerializer(queryset, many=True).data),
+        )
+        # A book without reviews keeps the default rating, another one has an
+        # unrounded average.
+        self.assertEqual(self.books[1].average_rating, 0)
+        self.assertEqual(Book.objects.get(pk=self.books[0].pk).average_rating, 10 / 3)
+
+    def test_review_list_serializer(self):
+        queryset = Review.objects.order_by('id')
+        self.assertEqual(
+            self.render(ReviewListSerializer(ReviewListSerializer.rows(queryset), many=True).data),
+            self.render(ReviewSerializer(queryset, many=True).data),
+        )
+
+
+class ResponseCacheTests(TestCase):
+    # Versions are bumped in on_commit callbacks, which TestCase only runs
+    # inside captureOnCommitCallbacks(execute=True).
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name='Author')
+        cls.book, cls.other_book = create_books(2, author=cls.author)
+        cls.user = create_users(1)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def get_list(self):
+        return self.client.get(reverse('book-list')).json()['results']
+
+    def get_detail(self, pk):
+        return self.client.get(reverse('book-detail', kwargs={'pk': pk})).json()
+
+    def test_served_from_cache(self):
+        titles = [item['title'] for item in self.get_list()]
+        detail = self.get_detail(self.book.pk)
+        # Changes that skip the signals are not seen until the entries go.
+        Book.objects.update(title='Changed')
+        with self.assertNumQueries(0):
+            self.assertEqual([item['title'] for item in self.get_list()], titles)
+            self.assertEqual(self.get_detail(self.book.pk), detail)
+
+    def test_book_save(self):
+        self.get_list()
+        self.get_detail(self.book.pk)
+        self.get_detail(self.other_book.pk)
+        Book.objects.filter(pk=self.other_book.pk).update(title='Changed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = 'New title'
+            self.book.save()
+            self.assertEqual(self.get_list()[0]['title'], 'Book 0')
+            self.assertEqual(self.get_detail(self.book.pk)['title'], 'Book 0')
+        self.assertEqual(self.get_list()[0]['title'], 'New title')
+        self.assertEqual(self.get_detail(self.book.pk)['title'], 'New title')
+        # Other detail pages depend only on their own book.
+        self.assertEqual(self.get_detail(self.other_book.pk)['title'], 'Book 1')
+
+    def test_book_delete(self):
+        self.assertEqual(len(self.get_list()), 2)
+        self.get_detail(self.book.pk)
+        pk = self.book.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.delete()
+            self.assertEqual(len(self.get_list()), 2)
+            self.assertEqual(self.get_detail(pk)['title'], 'Book 0')
+        self.assertEqual(len(self.get_list()), 1)
+        response = self.client.get(reverse('book-detail', kwargs={'pk': pk}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_review_save_and_delete(self):
+        self.get_list()
+        self.get_detail(self.book.pk)
+        self.get_detail(self.other_book.pk)
+        Book.objects.filter(pk=self.other_book.pk).update(title='Changed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(book=self.book, user=self.user, rating=4, comment='Good')
+            self.assertEqual(self.get_detail(self.book.pk)['reviews'], [])
+            self.assertEqual(self.get_list()[0]['average_rating'], 0)
+        self.assertEqual(self.get_detail(self.book.pk)['reviews'][0]['comment'], 'Good')
+        self.assertEqual(self.get_list()[0]['average_rating'], 4)
+        self.assertEqual(self.get_detail(self.other_book.pk)['title'], 'Book 1')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+            self.assertEqual(len(self.get_detail(self.book.pk)['reviews']), 1)
+        self.assertEqual(self.get_detail(self.book.pk)['reviews'], [])
+        self.assertEqual(self.get_list()[0]['average_rating'], 0)
+
+    def test_author_save(self):
+        self.get_list()
+        self.get_detail(self.book.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.name = 'Renamed'
+            self.author.save()
+            self.assertEqual(self.get_detail(self.book.pk)['author'], {'name': 'Author'})
+        self.assertEqual(self.get_detail(self.book.pk)['author'], {'name': 'Renamed'})
+        self.assertEqual(self.get_list()[0]['author'], {'name': 'Renamed'})
+
+    def test_author_delete(self):
+        self.get_list()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.delete()
+            self.assertEqual(len(self.get_list()), 2)
+        self.assertEqual(self.get_list(), [])
+
+
+class BatchFavoritesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = create_books(4)
+        cls.user, cls.other_user = create_users(2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, url_name, book_ids):
+        response = self.client.post(reverse(url_name), {'book_ids': book_ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return {int(book_id): result for book_id, result in response.json()['results'].items()}
+
+    def assert_counters(self):
+        for book in Book.objects.all():
+            favourites = FavoriteBook.objects.filter(book=book)
+            self.assertEqual(book.favourites_count, favourites.count())
+            expected = sum(
+                trending_weight(created_at, FAVOURITE_WEIGHT)
+                for created_at in favourites.values_list('created_at', flat=True)
+            )
+            # Stored scores are large, see book.leaderboards.
+            self.assertAlmostEqual(book.trending_score, expected, delta=expected * 1e-9)
+
+    def test_add(self):
+        first, second, third, _ = [book.pk for book in self.books]
+        FavoriteBook.objects.create(user=self.user, book_id=second)
+        FavoriteBook.objects.create(user=self.other_user, book_id=first)
+
+        results = self.post('batch-add-to-favorites', [first, second, first, 999999, third])
+        self.assertEqual(results, {
+            first: 'added',
+            second: 'already_in_favorites',
+            999999: 'not_found',
+            third: 'added',
+        })
+        self.assertEqual(
+            set(FavoriteBook.objects.filter(user=self.user).values_list('book_id', flat=True)),
+            {first, second, third},
+        )
+        self.assert_counters()
+        self.assertEqual(Book.objects.get(pk=first).favourites_count, 2)
+
+    def test_remove(self):
+        first, second, third, fourth = [book.pk for book in self.books]
+        self.post('batch-add-to-favorites', [first, second, third])
+        FavoriteBook.objects.create(user=self.other_user, book_id=first)
+
+        results = self.post('batch-remove-from-favorites', [first, first, fourth, 999999, third])
+        self.assertEqual(results, {
+            first: 'removed',
+            fourth: 'not_in_favorites',
+            999999: 'not_found',
+            third: 'removed',
+        })
+        self.assertEqual(
+            list(FavoriteBook.objects.filter(user=self.user).values_list('book_id', flat=True)),
+            [second],
+        )
+        self.assert_counters()
+        self.assertEqual(Book.objects.get(pk=first).favourites_count, 1)
+        self.assertEqual(Book.objects.get(pk=third).trending_score, 0)
+
+    def test_remove_runs_constant_queries(self):
+        book_ids = [book.pk for book in self.books]
+        self.post('batch-add-to-favorites', book_ids[:1])
+        with CaptureQueriesContext(connection) as single:
+            self.post('batch-remove-from-favorites', book_ids[:1])
+        # Read now: the next request resets the query log.
+        queries = len(single)
+        self.post('batch-add-to-favorites', book_ids)
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(queries):
+            self.post('batch-remove-from-favorites', book_ids)
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(FavoriteBook.objects.exists())
+        self.assert_counters()
+
+    def test_invalid_ids(self):
+        for book_ids in ([], [0], ['x'], list(range(1, 502))):
+            with self.subTest(book_ids=len(book_ids)):
+                response = self.client.post(
+                    reverse('batch-add-to-favorites'), {'book_ids': book_ids}, format='json',
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        response = self.client.post(reverse('batch-remove-from-favorites'), {'book_ids': [1]}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class FavoriteFlagTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = create_books(3)
+        cls.user, = create_users(1)
+        FavoriteBook.objects.create(user=cls.user, book=cls.books[1])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def flags(self, url_name, **kwargs):
+        response = self.client.get(reverse(url_name, kwargs=kwargs))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        items = data['results'] if 'results' in data else [data]
+        return {item['id']: item.get('is_favorited') for item in items}
+
+    def test_anonymous(self):
+        self.assertEqual(self.flags('book-list'), dict.fromkeys([book.pk for book in self.books]))
+
+    def test_authenticated(self):
+        self.client.force_authenticate(self.user)
+        first, second, third = [book.pk for book in self.books]
+        self.assertEqual(self.flags('book-list'), {first: False, second: True, third: False})
+        self.assertEqual(self.flags('book-detail', pk=second), {second: True})
+
+    def test_favourites_list_skips_lookup(self):
+        self.client.force_authenticate(self.user)
+        # The count and the page; no favourites lookup.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.flags('favorites-book-list'), {self.books[1].pk: True})
+
+    def test_schema(self):
+        for name in ('is_favorited', 'score'):
+            with self.subTest(name=name):
+                self.assertTrue(ScoredBookSerializer().fields[name].read_only)
+        # Documented, but never rendered by the serializer itself.
+        self.assertNotIn('is_favorited', BookSerializer(self.books[0]).data)
+
+
+class BookFacetCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.genres = [Genre.objects.create(name=f'Genre {i}') for i in range(2)]
+        cls.authors = [Author.objects.create(name=f'Author {i}') for i in range(2)]
+
+    def create_book(self, genre, author, year):
+        return Book.objects.create(
+            title='Book',
+            description='',
+            genre=genre,
+            author=author,
+            publication_date=datetime.date(year, 1, 1),
+        )
+
+    def assert_counts(self):
+        stored = set(
+            BookFacetCount.objects.filter(count__gt=0).values_list('dimension', 'key', 'count')
+        )
+        fresh = {
+            (dimension, row['key'], row['count'])
+            for dimension, expression in BookFacetCount.key_expressions().items()
+            for row in Book.objects.order_by().values(key=expression).annotate(count=Count('id'))
+        }
+        self.assertEqual(stored, fresh)
+
+    def test_create_update_delete(self):
+        first = self.create_book(self.genres[0], self.authors[0], 2000)
+        second = self.create_book(self.genres[0], self.authors[1], 2000)
+        self.create_book(self.genres[1], self.authors[1], 2001)
+        self.assert_counts()
+
+        first.title = 'Renamed'
+        first.save()
+        self.assert_counts()
+
+        first.genre = self.genres[1]
+        first.publication_date = datetime.date(2005, 1, 1)
+        first.save()
+        self.assert_counts()
+
+        second = Book.objects.get(pk=second.pk)
+        second.author = self.authors[0]
+        second.save()
+        self.assert_counts()
+
+        first.delete()
+        self.assert_counts()
+        Book.objects.get(pk=second.pk).delete()
+        self.assert_counts()
+
+    def test_save_of_partially_loaded_book(self):
+        book = self.create_book(self.genres[0], self.authors[0], 2000)
+        self.create_book(self.genres[0], self.authors[0], 2000)
+
+        book = Book.objects.only('id', 'title').get(pk=book.pk)
+        book.author = self.authors[1]
+        with mock.patch.object(BookFacetCount, 'rebuild') as rebuild:
+            book.save()
+        rebuild.assert_not_called()
+        self.assert_counts()
+
+        book = Book.objects.defer('genre', 'author', 'publication_date').get(pk=book.pk)
+        book.delete()
+        self.assert_counts()
+
+    def test_genre_and_author_delete(self):
+        self.create_book(self.genres[0], self.authors[0], 2000)
+        self.create_book(self.genres[0], self.authors[1], 2001)
+        self.create_book(self.genres[1], self.authors[1], 2001)
+        self.genres[0].delete()
+        self.assert_counts()
+        self.authors[1].delete()
+        self.assert_counts()
+
+
+class LeaderboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.genres = [Genre.objects.create(name=f'Genre {i}') for i in range(2)]
+        cls.authors = [Author.objects.create(name=f'Author {i}') for i in range(2)]
+        cls.users = create_users(20)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_book(self, genre=0, author=0):
+        return create_books(1, genre=self.genres[genre], author=self.authors[author])[0]
+
+    def review(self, book, ratings, days_ago=0):
+        created_at = timezone.now() - datetime.timedelta(days=days_ago)
+        for user, rating in zip(self.users, ratings):
+            Review.objects.create(book=book, user=user, rating=rating, comment='', created_at=created_at)
+
+    def favourite(self, book, count, days_ago=0):
+        created_at = timezone.now() - datetime.timedelta(days=days_ago)
+        for user in self.users[:count]:
+            FavoriteBook.objects.create(book=book, user=user, created_at=created_at)
+
+    def board(self, board, **kwargs):
+        url_name = 'leaderboard'
+        if 'genre_id' in kwargs:
+            url_name = 'genre-leaderboard'
+        elif 'author_id' in kwargs:
+            url_name = 'author-leaderboard'
+        response = self.client.get(reverse(url_name, kwargs={'board': board, **kwargs}))
+        self.assertEqual(response.status_code, 200)
+        return [(item['id'], item['score']) for item in response.json()['results']]
+
+    def test_top_rated_uses_bayesian_average(self):
+        single = self.create_book()
+        self.review(single, [5])
+        many = self.create_book()
+        self.review(many, [5, 4] * 10)
+        low = self.create_book()
+        self.review(low, [2, 3] * 5)
+        self.create_book()
+
+        self.assertEqual(self.board('top-rated'), [
+            (many.pk, round(bayesian_rating(90, 20), 2)),
+            (single.pk, round(bayesian_rating(5, 1), 2)),
+            (low.pk, round(bayesian_rating(25, 10), 2)),
+        ])
+
+    def test_trending_decays_with_age(self):
+        old = self.create_book()
+        self.favourite(old, 8, days_ago=28)
+        recent = self.create_book()
+        self.favourite(recent, 1)
+        reviewed = self.create_book()
+        self.review(reviewed, [3, 3], days_ago=7)
+        self.create_book()
+
+        board = self.board('trending')
+        self.assertEqual([book_id for book_id, _ in board], [reviewed.pk, recent.pk, old.pk])
+        # Scores are as of now: each event halves every 7 days.
+        self.assertEqual([score for _, score in board], [2.0, 1.0, 0.5])
+
+    def test_genre_and_author_boards(self):
+        books = {
+            (genre, author): self.create_book(genre, author)
+            for genre in range(2) for author in range(2)
+        }
+        for rating, book in enumerate(books.values(), start=2):
+            self.review(book, [rating] * 3)
+            self.favourite(book, rating)
+
+        for board in ('top-rated', 'trending'):
+            with self.subTest(board=board):
+                self.assertEqual(
+                    [book_id for book_id, _ in self.board(board, genre_id=self.genres[0].pk)],
+                    [books[0, 1].pk, books[0, 0].pk],
+                )
+                self.assertEqual(
+                    [book_id for book_id, _ in self.board(board, author_id=self.authors[1].pk)],
+                    [books[1, 1].pk, books[0, 1].pk],
+                )
+
+    def test_unknown_board(self):
+        response = self.client.get(reverse('leaderboard', kwargs={'board': 'newest'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class RecommendationTests(TestCase):
+    # Readers 0-2 share books a, b and c, reader 3 only read d; e and f are
+    # read together by reader 4 alone.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = create_users(6)
+        cls.books = dict(zip('abcdef', create_books(6)))
+
+    def setUp(self):
+        cache.clear()
+        # Otherwise every favourite of the fixture is re-read as new.
+        patcher = mock.patch.object(RecommendationBuilder, 'overlap', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.favourite({0: 'ab', 1: 'abc', 2: 'bc', 3: 'd', 4: 'ef'})
+
+    def favourite(self, histories):
+        for user, books in histories.items():
+            for book in books:
+                FavoriteBook.objects.create(user=self.users[user], book=self.books[book])
+
+    def build(self, incremental=False):
+        with self.captureOnCommitCallbacks(execute=True):
+            return RecommendationBuilder(top_k=2).build(incremental=incremental)
+
+    def neighbours(self):
+        names = {book.pk: name for name, book in self.books.items()}
+        neighbours = {name: [] for name in self.books}
+        for book_id, recommended_id, score in BookRecommendation.objects.order_by(
+            'book_id', '-score', 'recommended_id',
+        ).values_list('book_id', 'recommended_id', 'score'):
+            neighbours[names[book_id]].append((names[recommended_id], score))
+        return neighbours
+
+    def assertNeighbours(self, expected):
+        neighbours = self.neighbours()
+        self.assertEqual(neighbours.keys(), expected.keys())
+        for book, pairs in expected.items():
+            with self.subTest(book=book):
+                self.assertEqual([name for name, _ in neighbours[book]], [name for name, _ in pairs])
+                for (_, score), (_, expected_score) in zip(neighbours[book], pairs):
+                    self.assertAlmostEqual(score, expected_score, places=6)
+
+    def test_full_build(self):
+        build = self.build()
+        self.assertEqual(build.books_updated, 6)
+        # cos(x, y) = common readers / sqrt(readers of x * readers of y);
+        # a and c tie for b and are ordered by id.
+        self.assertNeighbours({
+            'a': [('b', 2 / 6 ** 0.5), ('c', 1 / 2)],
+            'b': [('a', 2 / 6 ** 0.5), ('c', 2 / 6 ** 0.5)],
+            'c': [('b', 2 / 6 ** 0.5), ('a', 1 / 2)],
+            'd': [],
+            'e': [('f', 1.0)],
+            'f': [('e', 1.0)],
+        })
+
+        response = self.client.get(reverse('book-recommendations', kwargs={'pk': self.books['a'].pk}))
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']],
+            [self.books['b'].pk, self.books['c'].pk],
+        )
+
+    def test_incremental_build(self):
+        self.build()
+        # c gains a reader who also read d: a and b are not in the reader's
+        # history, but their scores against c change with its norm.
+        self.favourite({3: 'c'})
+        build = self.build(incremental=True)
+        self.assertTrue(build.incremental)
+        self.assertEqual(build.books_updated, 4)
+        expected = {
+            'a': [('b', 2 / 6 ** 0.5), ('c', 1 / 6 ** 0.5)],
+            'b': [('a', 2 / 6 ** 0.5), ('c', 2 / 3)],
+            'c': [('b', 2 / 3), ('d', 1 / 3 ** 0.5)],
+            'd': [('c', 1 / 3 ** 0.5)],
+            'e': [('f', 1.0)],
+            'f': [('e', 1.0)],
+        }
+        self.assertNeighbours(expected)
+
+        # Same as a full build.
+        self.build()
+        self.assertNeighbours(expected)
+
+    def test_incremental_build_without_new_interactions(self):
+        previous = self.build()
+        with mock.patch('book.recommendations.load_interactions') as load_interactions:
+            build = self.build(incremental=True)
+        load_interactions.assert_not_called()
+        self.assertEqual(
+            (build.incremental, build.books_updated, build.favourite_watermark),
+            (True, 0, previous.favourite_watermark),
+        )
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tolstoy = Author.objects.create(name='Leo Tolstoy')
+        cls.other = Author.objects.create(name='Someone Else')
+        genre = Genre.objects.create(name='Novel')
+        cls.in_title, cls.in_author, cls.in_description = [
+            Book.objects.create(
+                title=title, description=description, genre=genre, author=author,
+                publication_date=datetime.date(1869, 1, 1),
+            )
+            for title, author, description in (
+                ('War and Peace', cls.other, 'A novel.'),
+                ('Anna Karenina', cls.tolstoy, 'Happy families.'),
+                ('Essays', cls.other, 'On war and on peace, with a chapter on Tolstoy.'),
+            )
+        ]
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('book-search'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, q, **params):
+        return [item['id'] for item in self.search(q, **params)['results']]
+
+    def test_ranking(self):
+        # Title matches weigh more than author ones, author more than description.
+        self.assertEqual(self.ids('war'), [self.in_title.pk, self.in_description.pk])
+        self.assertEqual(self.ids('tolstoy'), [self.in_author.pk, self.in_description.pk])
+        self.assertEqual(self.ids('nothing'), [])
+        self.assertEqual(self.ids(''), [])
+
+    def test_pagination(self):
+        books = create_books(12, genre=Genre.objects.get(), author=self.other)
+        first = self.search('book', limit=5)
+        self.assertEqual(first['count'], 12)
+        ids = [item['id'] for item in first['results']]
+        ids += self.ids('book', limit=5, page=2) + self.ids('book', limit=5, page=3)
+        # Equal scores are ordered by id.
+        self.assertEqual(ids, [book.pk for book in books])
+
+    def test_query_syntax(self):
+        # The websearch_to_tsquery syntax of the PostgreSQL backend.
+        cases = (
+            ('war peace', [self.in_title, self.in_description]),
+            ('war -essays', [self.in_title]),
+            ('-essays war', [self.in_title]),
+            ('"war and peace"', [self.in_title]),
+            ('"peace war"', []),
+            ('karenina or essays', [self.in_author, self.in_description]),
+            ('karenina OR "war and" -novel', [self.in_author, self.in_description]),
+            ('happy AND families', []),
+            ('-war', []),
+            ('title:war', []),
+            ('war*', [self.in_title, self.in_description]),
+        )
+        for q, books in cases:
+            with self.subTest(q=q):
+                self.assertEqual(sorted(self.ids(q)), sorted(book.pk for book in books))
+
+    def test_index_follows_book_save_and_delete(self):
+        self.in_title.title = 'Anna and the War'
+        self.in_title.save()
+        self.assertEqual(self.ids('peace'), [self.in_description.pk])
+        self.assertCountEqual(self.ids('anna'), [self.in_title.pk, self.in_author.pk])
+
+        self.in_author.delete()
+        self.assertEqual(self.ids('anna'), [self.in_title.pk])
+        self.assertEqual(self.ids('families'), [])
+
+    def test_index_follows_author_rename(self):
+        self.tolstoy.name = 'Lev Tolstoi'
+        self.tolstoy.save()
+        self.assertEqual(self.ids('lev'), [self.in_author.pk])
+        self.assertEqual(self.ids('leo'), [])
+
+    def test_rebuild_search_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM book_search_index')
+        Book.objects.filter(pk=self.in_author.pk).update(title='Resurrection')
+        self.assertEqual(self.ids('war'), [])
+
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Search index rebuilt.', out.getvalue())
+        self.assertEqual(self.ids('war'), [self.in_title.pk, self.in_description.pk])
+        self.assertEqual(self.ids('resurrection'), [self.in_author.pk])
+        self.assertEqual(self.ids('karenina'), [])
+
+
+class AsyncViewTests(TestCase):
+    # The async views answer exactly like their sync counterparts.
+
+    @classmethod
+    def setUpTestData(cls):
+        genre = Genre.objects.create(name='Genre 1')
+        cls.books = create_books(13, genre=genre)
+        cls.user, cls.other_user = create_users(2)
+        for book in cls.books[:7]:
+            FavoriteBook.objects.create(user=cls.user, book=book)
+        for user, rating in ((cls.user, 5), (cls.other_user, 3)):
+            Review.objects.create(user=user, book=cls.books[0], rating=rating, comment='Fine')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url_name, params=None, user=None, **kwargs):
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+        sync = self.client.get(reverse(url_name, kwargs=kwargs), params, **headers)
+        response = self.client.get(reverse(f'async-{url_name}', kwargs=kwargs), params, **headers)
+        self.assertEqual(response.status_code, sync.status_code)
+        # Links differ only in the async path prefix.
+        body = json.loads(response.content.decode().replace('/async/', '/'))
+        self.assertEqual(body, sync.json())
+        return response.status_code, body
+
+    def test_book_list(self):
+        cases = (
+            {},
+            {'page': 2, 'limit': 5},
+            {'genre_name': 'genre 1', 'ordering': '-title'},
+            {'pagination': 'cursor', 'limit': 5},
+        )
+        for user in (None, self.user):
+            for params in cases:
+                with self.subTest(params=params, user=user):
+                    status, body = self.get('book-list', params, user=user)
+                    self.assertEqual(status, 200)
+                    self.assertEqual(all('is_favorited' in item for item in body['results']), user is not None)
+
+    def test_book_list_cursor_pages(self):
+        params = {'pagination': 'cursor', 'limit': 5, 'ordering': 'favourites_count'}
+        self.get('book-list', params)
+        body = json.loads(self.client.get(reverse('async-book-list'), params).content)
+        ids = [item['id'] for item in body['results']]
+        while body['next']:
+            self.assertIn('/async/list/', body['next'])
+            body = json.loads(self.client.get(body['next']).content)
+            ids += [item['id'] for item in body['results']]
+        self.assertEqual(ids, list(Book.objects.order_by('favourites_count', 'id').values_list('id', flat=True)))
+
+    def test_book_detail(self):
+        for user in (None, self.user):
+            with self.subTest(user=user):
+                status, body = self.get('book-detail', user=user, pk=self.books[0].pk)
+                self.assertEqual(status, 200)
+                self.assertEqual(len(body['reviews']), 2)
+        self.assertEqual(self.get('book-detail', pk=999999)[0], 404)
+
+    def test_favorites_list(self):
+        status, body = self.get('favorites-book-list', {'limit': 5}, user=self.user)
+        self.assertEqual(status, 200)
+        self.assertEqual(body['count'], 7)
+        self.assertTrue(all(item['is_favorited'] for item in body['results']))
+        self.assertEqual(self.get('favorites-book-list', {'pagination': 'cursor'}, user=self.user)[0], 200)
 
-# Create your tests here.
+    def test_errors(self):
+        self.assertEqual(self.get('favorites-book-list')[0], 401)
+        response = self.client.get(reverse('async-book-list'), HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+        self.assertEqual(self.get('book-list', {'page': 99})[0], 404)
+        self.assertEqual(self.get('book-list', {'publication_date_after': 'not a date'})[0], 400)
+        self.assertEqual(self.get('book-list', {'pagination': 'cursor', 'cursor': 'invalid'})[0], 400)
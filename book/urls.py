@@ -1,20 +1,46 @@
 from django.urls import path
+from book.async_views import (
+    AsyncBookDetailView,
+    AsyncBookListView,
+    AsyncFavoritesBookListView,
+)
 from book.views import (
     BookListView,
     BookDetailView,
+    BookExportView,
+    BookFacetView,
+    BookRecommendationView,
+    BookReviewListView,
+    BookSearchView,
+    LeaderboardView,
     ReviewListCreateView,
     ReviewDetailView,
     FavoritesBookListView,
     AddToFavoritesView,
     RemoveFromFavoritesView,
+    BatchAddToFavoritesView,
+    BatchRemoveFromFavoritesView,
 )
 
 urlpatterns = [
     path('list/', BookListView.as_view(), name='book-list'),
+    path('facets/', BookFacetView.as_view(), name='book-facets'),
+    path('leaderboards/<slug:board>/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboards/<slug:board>/genre/<int:genre_id>/', LeaderboardView.as_view(), name='genre-leaderboard'),
+    path('leaderboards/<slug:board>/author/<int:author_id>/', LeaderboardView.as_view(), name='author-leaderboard'),
     path('detail/<int:pk>/', BookDetailView.as_view(), name='book-detail'),
+    path('detail/<int:pk>/reviews/', BookReviewListView.as_view(), name='book-review-list'),
+    path('detail/<int:pk>/recommendations/', BookRecommendationView.as_view(), name='book-recommendations'),
+    path('export/', BookExportView.as_view(), name='book-export'),
+    path('search/', BookSearchView.as_view(), name='book-search'),
     path('reviews/', ReviewListCreateView.as_view(), name='review-list'),
     path('reviews/<int:pk>/', ReviewDetailView.as_view(), name='review-detail'),
     path('favorites-book-list/', FavoritesBookListView.as_view(), name='favorites-book-list'),
     path('add-to-favorites/<int:book_id>/', AddToFavoritesView.as_view(), name='add-to-favorites'),
     path('remove-from-favorites/<int:book_id>/', RemoveFromFavoritesView.as_view(), name='remove-from-favorites'),
+    path('add-to-favorites/batch/', BatchAddToFavoritesView.as_view(), name='batch-add-to-favorites'),
+    path('remove-from-favorites/batch/', BatchRemoveFromFavoritesView.as_view(), name='batch-remove-from-favorites'),
+    path('async/list/', AsyncBookListView.as_view(), name='async-book-list'),
+    path('async/detail/<int:pk>/', AsyncBookDetailView.as_view(), name='async-book-detail'),
+    path('async/favorites-book-list/', AsyncFavoritesBookListView.as_view(), name='async-favorites-book-list'),
 ]
@@ -1,5 +1,14 @@
+import csv
+import io
+import json
+
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework import (
@@ -7,6 +16,7 @@ from rest_framework import (
     permissions,
     status,
 )
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.permissions import (
     IsAuthenticated,
@@ -19,21 +29,113 @@ from book.models import (
 )
 from book.serializers import (
     BookSerializer,
+    BookListSerializer,
     BookDetailSerializer,
+    LeaderboardSerializer,
+    LeaderboardResponseSerializer,
+    RecommendedBookSerializer,
+    RecommendationResponseSerializer,
     ReviewSerializer,
+    ReviewListSerializer,
+    ReviewDetailSerializer,
+    FavoriteBooksBatchSerializer,
+)
+from book.filters import (
+    BookFilter,
+    BookOrderingFilter,
+    PathFilterBackend,
+    ReviewFilter,
 )
-from book.filters import BookFilter
-from book.pagination import CustomPagination
+from book.cache import (
+    ALL_BOOKS,
+    CATALOG,
+    VersionedCacheMixin,
+    book_namespace,
+    invalidate,
+)
+from book.facets import get_facets
+from book.leaderboards import FAVOURITE_WEIGHT, trending_weight
+from book.pagination import CustomPagination, SearchPagination
+from book.search import SearchResults
+
+
+class FavoriteFlagMixin:
+    # Adds is_favorited to every book of the response for authenticated
+    # users; anonymous requests do not run the extra query.
+    def add_favorite_flags(self, response):
+        user = self.request.user
+        if response.status_code != 200 or not user.is_authenticated:
+            return response
+
+        data = response.data
+        if isinstance(data, dict) and 'results' in data:
+            response.data = {
+                **data,
+                'results': self.with_favorite_flags(data['results'], user),
+            }
+        elif isinstance(data, list):
+            response.data = self.with_favorite_flags(data, user)
+        else:
+            response.data = self.with_favorite_flags([data], user)[0]
+        return response
+
+    def with_favorite_flags(self, items, user):
+        return BookSerializer.with_favorite_flags(items, user)
+
+    def list(self, request, *args, **kwargs):
+        return self.add_favorite_flags(super().list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.add_favorite_flags(super().retrieve(request, *args, **kwargs))
+
+
+class ValuesListMixin:
+    # GET lists render values() rows through list_serializer_class, a
+    # read-only fast path with the JSON of serializer_class. Writes and the
+    # API schema keep serializer_class.
+    list_serializer_class = None
+
+    def use_values(self):
+        return (
+            self.request is not None
+            and self.request.method == 'GET'
+            and not getattr(self, 'swagger_fake_view', False)
+        )
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.use_values():
+            return self.list_serializer_class.rows(queryset)
+        return queryset
 
+    def get_serializer_class(self):
+        if self.use_values():
+            return self.list_serializer_class
+        return super().get_serializer_class()
 
-class BookListView(generics.ListAPIView):
+
+class BookListView(FavoriteFlagMixin, VersionedCacheMixin, ValuesListMixin, generics.ListAPIView):
+    cache_prefix = 'list'
     queryset = Book.objects.select_related('genre', 'author').all()
     serializer_class = BookSerializer
+    list_serializer_class = BookListSerializer
     pagination_class = CustomPagination
     filter_backends = (
         DjangoFilterBackend,
+        BookOrderingFilter,
     )
     filterset_class = BookFilter
+    ordering_fields = (
+        'average_rating',
+        'rating_count',
+        'publication_date',
+        'title',
+        'favourites_count',
+    )
+    ordering = ('id',)
+
+    def get_cache_namespaces(self):
+        return [CATALOG]
 
     @swagger_auto_schema(
         tags=['Books'],
@@ -44,6 +146,13 @@ class BookListView(generics.ListAPIView):
             openapi.Parameter('limit', in_=openapi.IN_QUERY,
                               type=openapi.TYPE_INTEGER,
                               description='Количество результатов, возвращаемых на страницу.'),
+            openapi.Parameter('pagination', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              enum=['cursor'],
+                              description='Режим постраничной навигации: cursor - по курсору, без подсчёта.'),
+            openapi.Parameter('cursor', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              description='Курсор из ссылок next/previous (в режиме cursor).'),
             openapi.Parameter('publication_date_after', in_=openapi.IN_QUERY,
                               type=openapi.TYPE_STRING,
                               format=openapi.FORMAT_DATE,
@@ -51,17 +160,149 @@ class BookListView(generics.ListAPIView):
             openapi.Parameter('publication_date_before', in_=openapi.IN_QUERY,
                               type=openapi.TYPE_STRING,
                               format=openapi.FORMAT_DATE,
-                              description='Дата публикации до (в формате YYYY-MM-DD).')
+                              description='Дата публикации до (в формате YYYY-MM-DD).'),
+            openapi.Parameter('ordering', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              description='Сортировка: average_rating, rating_count, publication_date, '
+                                          'title, favourites_count. Префикс "-" для убывания.'),
         ]
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
 
-class BookDetailView(generics.RetrieveAPIView):
-    queryset = Book.objects.select_related('genre', 'author').all()
+class LimitMixin:
+    # Bounded top-K responses: ?limit=, capped at max_limit.
+    limit_query_param = 'limit'
+    limit = 10
+    max_limit = 100
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.limit
+        return min(limit, self.max_limit) if limit > 0 else self.limit
+
+
+class BookFacetView(LimitMixin, VersionedCacheMixin, generics.GenericAPIView):
+    cache_prefix = 'facets'
+    queryset = Book.objects.all()
+
+    def get_cache_namespaces(self):
+        return [CATALOG]
+
+    def build_response(self):
+        filterset = BookFilter(self.request.query_params, queryset=self.get_queryset(), request=self.request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return Response(get_facets(filterset, self.get_limit()))
+
+    @swagger_auto_schema(
+        tags=['Books'],
+        manual_parameters=[
+            openapi.Parameter('genre_name', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              description='Название жанра.'),
+            openapi.Parameter('author_name', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              description='Имя автора.'),
+            openapi.Parameter('publication_date_after', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              format=openapi.FORMAT_DATE,
+                              description='Дата публикации после (в формате YYYY-MM-DD).'),
+            openapi.Parameter('publication_date_before', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              format=openapi.FORMAT_DATE,
+                              description='Дата публикации до (в формате YYYY-MM-DD).'),
+            openapi.Parameter('limit', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_INTEGER,
+                              description='Количество значений в каждом фасете (по умолчанию 10, не более 100).'),
+        ],
+        responses={
+            200: 'Количество книг по жанрам (genres), авторам (authors) и годам публикации (years).',
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        return self.get_cached_response(request, self.build_response)
+
+
+class LeaderboardView(FavoriteFlagMixin, LimitMixin, VersionedCacheMixin, generics.GenericAPIView):
+    # Top-K reads straight off the (score, id) and (genre|author, score, id)
+    # indexes on Book; the scores are maintained by book.signals.
+    cache_prefix = 'leaderboard'
+    serializer_class = LeaderboardSerializer
+    boards = {
+        'top-rated': 'weighted_rating',
+        'trending': 'trending_score',
+    }
+
+    def get_cache_namespaces(self):
+        return [CATALOG]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Book.objects.none()
+
+        field = self.boards[self.kwargs['board']]
+        books = Book.objects.filter(**{f'{field}__gt': 0})
+        if 'genre_id' in self.kwargs:
+            books = books.filter(genre_id=self.kwargs['genre_id'])
+        if 'author_id' in self.kwargs:
+            books = books.filter(author_id=self.kwargs['author_id'])
+        return LeaderboardSerializer.rows(books.order_by(f'-{field}', '-id'))[:self.get_limit()]
+
+    def get_serializer_context(self):
+        return {
+            **super().get_serializer_context(),
+            'board': self.kwargs.get('board'),
+            'now': timezone.now(),
+        }
+
+    def build_response(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return Response({'board': self.kwargs['board'], 'results': serializer.data})
+
+    @swagger_auto_schema(
+        tags=['Books'],
+        operation_description='Лучшие книги (top-rated, байесовский средний рейтинг) или '
+                              'популярные сейчас (trending, активность с затуханием во времени). '
+                              'Доступны общий рейтинг и рейтинги по жанру и автору.',
+        manual_parameters=[
+            openapi.Parameter('board', in_=openapi.IN_PATH,
+                              type=openapi.TYPE_STRING,
+                              enum=list(boards),
+                              description='Рейтинг: top-rated или trending.',
+                              required=True),
+            openapi.Parameter('limit', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_INTEGER,
+                              description='Количество книг (по умолчанию 10, не более 100).'),
+        ],
+        responses={200: LeaderboardResponseSerializer},
+    )
+    def get(self, request, *args, **kwargs):
+        if kwargs['board'] not in self.boards:
+            raise NotFound('Unknown leaderboard.')
+        return self.add_favorite_flags(self.get_cached_response(request, self.build_response))
+
+
+class BookDetailView(FavoriteFlagMixin, VersionedCacheMixin, generics.RetrieveAPIView):
+    cache_prefix = 'detail'
     serializer_class = BookDetailSerializer
 
+    def get_queryset(self):
+        # One extra query for the newest reviews and their authors, however
+        # many reviews the book has. One more than embedded is fetched to
+        # know whether reviews_next is needed.
+        latest_reviews = Review.objects.select_related('user').order_by('-id')
+        limit = self.serializer_class.reviews_limit + 1
+        return Book.objects.select_related('genre', 'author').prefetch_related(
+            Prefetch('reviews', queryset=latest_reviews[:limit], to_attr='latest_reviews'),
+        )
+
+    def get_cache_namespaces(self):
+        return [book_namespace(self.kwargs['pk']), ALL_BOOKS]
+
     @swagger_auto_schema(
         tags=['Books'],
         manual_parameters=[
@@ -78,21 +319,254 @@ class BookDetailView(generics.RetrieveAPIView):
         return super().get(request, *args, **kwargs)
 
 
-class ReviewListCreateView(generics.ListCreateAPIView):
-    queryset = Review.objects.all()
+class BookRecommendationView(FavoriteFlagMixin, LimitMixin, VersionedCacheMixin, generics.GenericAPIView):
+    # Precomputed by build_recommendations; one query along
+    # book_recommendation_idx joined to the recommended books.
+    cache_prefix = 'recommendations'
+    serializer_class = RecommendedBookSerializer
+
+    def get_cache_namespaces(self):
+        return [CATALOG]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Book.objects.none()
+
+        books = Book.objects.filter(
+            recommended_for__book_id=self.kwargs['pk'],
+        ).annotate(
+            score=F('recommended_for__score'),
+        ).order_by('-score', 'recommended_for__recommended_id')
+        return RecommendedBookSerializer.rows(books)[:self.get_limit()]
+
+    def build_response(self):
+        results = self.get_serializer(self.get_queryset(), many=True).data
+        if not results:
+            get_object_or_404(Book.objects.only('id'), pk=self.kwargs['pk'])
+        return Response({'results': results})
+
+    @swagger_auto_schema(
+        tags=['Books'],
+        operation_description='Книги, которые добавляли в избранное читатели этой книги.',
+        manual_parameters=[
+            openapi.Parameter(
+                name="id",
+                in_=openapi.IN_PATH,
+                type=openapi.TYPE_INTEGER,
+                description="Уникальный идентификатор книги",
+                required=True,
+            ),
+            openapi.Parameter('limit', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_INTEGER,
+                              description='Количество книг (по умолчанию 10, не более 100).'),
+        ],
+        responses={200: RecommendationResponseSerializer},
+    )
+    def get(self, request, *args, **kwargs):
+        return self.add_favorite_flags(self.get_cached_response(request, self.build_response))
+
+
+class BookReviewListView(generics.ListAPIView):
+    # review-list?book=<pk> with the reviewers' emails: the same filters,
+    # newest-first ordering and pagination, with the book taken from the path.
+    queryset = Review.objects.select_related('user').order_by('-id')
+    serializer_class = ReviewDetailSerializer
+    pagination_class = CustomPagination
+    filter_backends = (
+        PathFilterBackend,
+    )
+    filterset_class = ReviewFilter
+    path_filters = {'book': 'pk'}
+
+    @swagger_auto_schema(
+        tags=['Books'],
+        manual_parameters=[
+            openapi.Parameter(
+                name="id",
+                in_=openapi.IN_PATH,
+                type=openapi.TYPE_INTEGER,
+                description="Уникальный идентификатор книги",
+                required=True,
+            ),
+            openapi.Parameter('user', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_INTEGER,
+                              description='Только отзывы пользователя с этим ID.'),
+            openapi.Parameter('page', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_INTEGER,
+                              description='Номер страницы для постраничных результатов.'),
+            openapi.Parameter('limit', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_INTEGER,
+                              description='Количество результатов, возвращаемых на страницу.'),
+            openapi.Parameter('pagination', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              enum=['cursor'],
+                              description='Режим постраничной навигации: cursor - по курсору, без подсчёта.'),
+            openapi.Parameter('cursor', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              description='Курсор из ссылок next/previous (в режиме cursor).'),
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class BookExportView(generics.GenericAPIView):
+    queryset = Book.objects.all()
+    filter_backends = (
+        DjangoFilterBackend,
+    )
+    filterset_class = BookFilter
+    export_fields = (
+        ('id', 'id'),
+        ('title', 'title'),
+        ('genre', 'genre__name'),
+        ('author', 'author__name'),
+        ('publication_date', 'publication_date'),
+        ('average_rating', 'average_rating'),
+        ('reviews_count', 'rating_count'),
+        ('description', 'description'),
+    )
+    chunk_size = 2000
+    rows_per_write = 500
+
+    def perform_content_negotiation(self, request, force=False):
+        # The body is CSV or NDJSON whatever the Accept header says.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get_rows(self, queryset):
+        lookups = [lookup for _, lookup in self.export_fields]
+        for row in queryset.values_list(*lookups).iterator(chunk_size=self.chunk_size):
+            row = dict(zip((name for name, _ in self.export_fields), row))
+            row['publication_date'] = row['publication_date'].isoformat()
+            row['average_rating'] = round(row['average_rating'], 2)
+            yield row
+
+    def stream_ndjson(self, rows):
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(row, ensure_ascii=False))
+            if len(lines) >= self.rows_per_write:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    def stream_csv(self, rows):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=[name for name, _ in self.export_fields])
+        writer.writeheader()
+        for count, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if count % self.rows_per_write == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    @swagger_auto_schema(
+        tags=['Books'],
+        manual_parameters=[
+            openapi.Parameter('export_format', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              enum=['ndjson', 'csv'],
+                              description='Формат выгрузки: ndjson (по умолчанию) или csv.'),
+            openapi.Parameter('publication_date_after', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              format=openapi.FORMAT_DATE,
+                              description='Дата публикации после (в формате YYYY-MM-DD).'),
+            openapi.Parameter('publication_date_before', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              format=openapi.FORMAT_DATE,
+                              description='Дата публикации до (в формате YYYY-MM-DD).'),
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            return Response({
+                'error': 'export_format must be ndjson or csv.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        # Filters are validated here, while a 400 can still be returned; the
+        # generators only consume the rows once the 200 has gone out.
+        queryset = self.filter_queryset(self.get_queryset()).order_by('id')
+        if export_format == 'csv':
+            response = StreamingHttpResponse(
+                self.stream_csv(self.get_rows(queryset)), content_type='text/csv; charset=utf-8',
+            )
+        else:
+            response = StreamingHttpResponse(
+                self.stream_ndjson(self.get_rows(queryset)), content_type='application/x-ndjson',
+            )
+
+        response['Content-Disposition'] = f'attachment; filename="books.{export_format}"'
+        return response
+
+
+class BookSearchView(FavoriteFlagMixin, generics.ListAPIView):
+    serializer_class = BookSerializer
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        return SearchResults(query, Book.objects.select_related('genre', 'author'))
+
+    @swagger_auto_schema(
+        tags=['Books'],
+        manual_parameters=[
+            openapi.Parameter('q', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              description='Поисковый запрос по названию, описанию и автору книги. '
+                                          'Слова ищутся вместе; поддерживаются "фразы в кавычках", '
+                                          'or между словами и -слово для исключения.',
+                              required=True),
+            openapi.Parameter('page', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_INTEGER,
+                              description='Номер страницы для постраничных результатов.'),
+            openapi.Parameter('limit', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_INTEGER,
+                              description='Количество результатов, возвращаемых на страницу.'),
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class ReviewListCreateView(ValuesListMixin, generics.ListCreateAPIView):
+    # Newest first; filtered pages run along the (book, id) and (user, id)
+    # indexes on Review.
+    queryset = Review.objects.order_by('-id')
     serializer_class = ReviewSerializer
+    list_serializer_class = ReviewListSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = CustomPagination
+    filter_backends = (
+        DjangoFilterBackend,
+    )
+    filterset_class = ReviewFilter
 
     @swagger_auto_schema(
         tags=['Review'],
         manual_parameters=[
+            openapi.Parameter('book', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_INTEGER,
+                              description='Только отзывы на книгу с этим ID.'),
+            openapi.Parameter('user', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_INTEGER,
+                              description='Только отзывы пользователя с этим ID.'),
             openapi.Parameter('page', in_=openapi.IN_QUERY,
                               type=openapi.TYPE_INTEGER,
                               description='Номер страницы для постраничных результатов.'),
             openapi.Parameter('limit', in_=openapi.IN_QUERY,
                               type=openapi.TYPE_INTEGER,
-                              description='Количество результатов, возвращаемых на страницу.')
+                              description='Количество результатов, возвращаемых на страницу.'),
+            openapi.Parameter('pagination', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              enum=['cursor'],
+                              description='Режим постраничной навигации: cursor - по курсору, без подсчёта.'),
+            openapi.Parameter('cursor', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              description='Курсор из ссылок next/previous (в режиме cursor).'),
         ]
     )
     def get(self, request, *args, **kwargs):
@@ -211,16 +685,21 @@ class AddToFavoritesView(generics.CreateAPIView):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class FavoritesBookListView(generics.ListAPIView):
+class FavoritesBookListView(FavoriteFlagMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = BookSerializer
+    list_serializer_class = BookListSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = CustomPagination
 
     def get_queryset(self):
         user = self.request.user
-        favourite_books = user.favorite_books.select_related('genre', 'author').all()
+        favourite_books = user.favorite_books.select_related('genre', 'author').order_by('id')
         return favourite_books
 
+    def with_favorite_flags(self, items, user):
+        # Every book listed here is a favourite; no lookup needed.
+        return [{**item, 'is_favorited': True} for item in items]
+
     @swagger_auto_schema(
         tags=['Favorites'],
         manual_parameters=[
@@ -230,6 +709,13 @@ class FavoritesBookListView(generics.ListAPIView):
             openapi.Parameter('limit', in_=openapi.IN_QUERY,
                               type=openapi.TYPE_INTEGER,
                               description='Количество результатов, возвращаемых на страницу.'),
+            openapi.Parameter('pagination', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              enum=['cursor'],
+                              description='Режим постраничной навигации: cursor - по курсору, без подсчёта.'),
+            openapi.Parameter('cursor', in_=openapi.IN_QUERY,
+                              type=openapi.TYPE_STRING,
+                              description='Курсор из ссылок next/previous (в режиме cursor).'),
         ]
     )
     def get(self, request, *args, **kwargs):
@@ -273,3 +759,94 @@ class RemoveFromFavoritesView(generics.DestroyAPIView):
                     status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BatchFavoritesView(generics.GenericAPIView):
+    serializer_class = FavoriteBooksBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_book_ids(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        book_ids = list(dict.fromkeys(serializer.validated_data['book_ids']))
+        found = Book.objects.only('id').in_bulk(book_ids)
+        return book_ids, found
+
+    def get_favorited_ids(self, book_ids):
+        # Book id -> when it was favourited.
+        return dict(FavoriteBook.objects.filter(
+            user=self.request.user,
+            book_id__in=book_ids,
+        ).values_list('book_id', 'created_at'))
+
+    def update_favourites(self, trending):
+        # bulk_create and _raw_delete bypass the FavoriteBook signals, so the
+        # counters, the trending scores and the cached list are refreshed
+        # here once per batch. trending maps the changed book ids to the
+        # trending terms to add, negative for removals.
+        if trending:
+            Book.rebuild_favourites_count(list(trending))
+            Book.apply_trending(trending)
+            invalidate(CATALOG)
+
+
+class BatchAddToFavoritesView(BatchFavoritesView):
+
+    @swagger_auto_schema(
+        tags=['Favorites'],
+        operation_description='Добавляет в избранное до 500 книг за один запрос.',
+    )
+    def post(self, request, *args, **kwargs):
+        book_ids, found = self.get_book_ids(request)
+        favorited = self.get_favorited_ids(found)
+        added = [book_id for book_id in found if book_id not in favorited]
+
+        now = timezone.now()
+        with transaction.atomic():
+            FavoriteBook.objects.bulk_create(
+                [FavoriteBook(user=request.user, book_id=book_id, created_at=now) for book_id in added],
+                ignore_conflicts=True,
+            )
+            weight = trending_weight(now, FAVOURITE_WEIGHT)
+            self.update_favourites({book_id: weight for book_id in added})
+
+        results = {}
+        for book_id in book_ids:
+            if book_id not in found:
+                results[book_id] = 'not_found'
+            elif book_id in favorited:
+                results[book_id] = 'already_in_favorites'
+            else:
+                results[book_id] = 'added'
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class BatchRemoveFromFavoritesView(BatchFavoritesView):
+
+    @swagger_auto_schema(
+        tags=['Favorites'],
+        operation_description='Удаляет из избранного до 500 книг за один запрос.',
+    )
+    def post(self, request, *args, **kwargs):
+        book_ids, found = self.get_book_ids(request)
+        favorited = self.get_favorited_ids(found)
+
+        with transaction.atomic():
+            # One DELETE without the per-row post_delete receivers; nothing
+            # references FavoriteBook, so there is nothing to cascade.
+            favourites = FavoriteBook.objects.filter(user=request.user, book_id__in=favorited)
+            favourites._raw_delete(favourites.db)
+            self.update_favourites({
+                book_id: -trending_weight(created_at, FAVOURITE_WEIGHT)
+                for book_id, created_at in favorited.items()
+            })
+
+        results = {}
+        for book_id in book_ids:
+            if book_id not in found:
+                results[book_id] = 'not_found'
+            elif book_id in favorited:
+                results[book_id] = 'removed'
+            else:
+                results[book_id] = 'not_in_favorites'
+        return Response({'results': results}, status=status.HTTP_200_OK)
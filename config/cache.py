@@ -0,0 +1,248 @@
+"Two-tier cache backend: a bounded in-process LRU in front of a shared cache."
+import os
+import pickle
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Cache handlers are per thread, so the local tier lives at module level,
+# keyed by backend name, and is shared by every thread of the process.
+_entries = {}
+_stats = {}
+_locks = {}
+
+STAMP_SUFFIX = ':stamp'
+
+
+class LocalEntry:
+    __slots__ = ('value', 'stamp', 'expires_at', 'checked_at')
+
+    def __init__(self, value, stamp, expires_at, checked_at):
+        self.value = value
+        self.stamp = stamp
+        self.expires_at = expires_at
+        self.checked_at = checked_at
+
+
+class TieredCache(BaseCache):
+    """
+    Keeps recently used entries in process memory and falls through to the
+    cache alias named by LOCATION (the shared tier).
+
+    Every write also stores a random stamp next to the value in the shared
+    tier. A local entry is trusted for LOCAL_TIMEOUT seconds; after that it
+    is revalidated by fetching only the stamp, so writes and deletes made by
+    other workers become visible within LOCAL_TIMEOUT without refetching
+    unchanged values.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._entries = _entries.setdefault(location, OrderedDict())
+        self._stats = _stats.setdefault(location, {
+            'hits': 0,
+            'misses': 0,
+            'revalidations': 0,
+            'evictions': 0,
+        })
+        self._lock = _locks.setdefault(location, Lock())
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'max_entries': self._local_max_entries,
+            }
+
+    def _new_stamp(self):
+        return os.urandom(8).hex()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _store(self, key, value, stamp, timeout):
+        entry = LocalEntry(
+            pickle.dumps(value, self.pickle_protocol),
+            stamp,
+            self.get_backend_timeout(timeout),
+            time.monotonic(),
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._local_max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _lookup(self, key):
+        # Returns (entry, fresh) for a live local entry, or (None, False).
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            if entry.expires_at is not None and entry.expires_at <= time.time():
+                del self._entries[key]
+                return None, False
+            self._entries.move_to_end(key)
+            fresh = time.monotonic() - entry.checked_at < self._local_timeout
+            return entry, fresh
+
+    def _revalidated(self, key, entry):
+        with self._lock:
+            entry.checked_at = time.monotonic()
+            self._entries[key] = entry
+            self._stats['hits'] += 1
+            self._stats['revalidations'] += 1
+        return pickle.loads(entry.value)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        stamp_key = key + STAMP_SUFFIX
+        entry, fresh = self._lookup(local_key)
+        if fresh:
+            self._count('hits')
+            return pickle.loads(entry.value)
+
+        if entry is not None:
+            stamp = self.shared.get(stamp_key, version=version)
+            if stamp is not None and stamp == entry.stamp:
+                return self._revalidated(local_key, entry)
+
+        found = self.shared.get_many([key, stamp_key], version=version)
+        if key not in found:
+            self._forget(local_key)
+            self._count('misses')
+            return default
+        self._count('misses')
+        self._store(local_key, found[key], found.get(stamp_key), DEFAULT_TIMEOUT)
+        return found[key]
+
+    def get_many(self, keys, version=None):
+        result = {}
+        stale = {}
+        missing = []
+        for key in keys:
+            local_key = self.make_and_validate_key(key, version=version)
+            entry, fresh = self._lookup(local_key)
+            if fresh:
+                self._count('hits')
+                result[key] = pickle.loads(entry.value)
+            elif entry is not None:
+                stale[key] = (local_key, entry)
+            else:
+                missing.append(key)
+
+        if stale:
+            stamps = self.shared.get_many(
+                [key + STAMP_SUFFIX for key in stale], version=version,
+            )
+            for key, (local_key, entry) in stale.items():
+                stamp = stamps.get(key + STAMP_SUFFIX)
+                if stamp is not None and stamp == entry.stamp:
+                    result[key] = self._revalidated(local_key, entry)
+                else:
+                    missing.append(key)
+
+        if missing:
+            found = self.shared.get_many(
+                [name for key in missing for name in (key, key + STAMP_SUFFIX)],
+                version=version,
+            )
+            for key in missing:
+                local_key = self.make_and_validate_key(key, version=version)
+                self._count('misses')
+                if key in found:
+                    result[key] = found[key]
+                    self._store(local_key, found[key], found.get(key + STAMP_SUFFIX), DEFAULT_TIMEOUT)
+                else:
+                    self._forget(local_key)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        stamp = self._new_stamp()
+        self.shared.set_many(
+            {key: value, key + STAMP_SUFFIX: stamp}, timeout=timeout, version=version,
+        )
+        self._store(local_key, value, stamp, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        stamps = {key: self._new_stamp() for key in data}
+        shared_data = dict(data)
+        shared_data.update({key + STAMP_SUFFIX: stamp for key, stamp in stamps.items()})
+        failed = self.shared.set_many(shared_data, timeout=timeout, version=version)
+        for key, value in data.items():
+            local_key = self.make_and_validate_key(key, version=version)
+            self._store(local_key, value, stamps[key], timeout)
+        return [key for key in failed if not key.endswith(STAMP_SUFFIX)]
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        if not self.shared.add(key, value, timeout=timeout, version=version):
+            return False
+        stamp = self._new_stamp()
+        self.shared.set(key + STAMP_SUFFIX, stamp, timeout=timeout, version=version)
+        self._store(local_key, value, stamp, timeout)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self._forget(local_key)
+        value = self.shared.incr(key, delta, version=version)
+        # Counters carry no stamp, so every worker refetches them once its
+        # local copy is older than LOCAL_TIMEOUT.
+        self.shared.delete(key + STAMP_SUFFIX, version=version)
+        self._store(local_key, value, None, DEFAULT_TIMEOUT)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self._forget(local_key)
+        touched = self.shared.touch(key, timeout=timeout, version=version)
+        if touched:
+            self.shared.touch(key + STAMP_SUFFIX, timeout=timeout, version=version)
+        return touched
+
+    def has_key(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        entry, fresh = self._lookup(local_key)
+        if fresh:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        self._forget(self.make_and_validate_key(key, version=version))
+        self.shared.delete(key + STAMP_SUFFIX, version=version)
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._forget(self.make_and_validate_key(key, version=version))
+        self.shared.delete_many(
+            [name for key in keys for name in (key, key + STAMP_SUFFIX)],
+            version=version,
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.shared.clear()
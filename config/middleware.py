@@ -0,0 +1,121 @@
+"Per-request SQL instrumentation: Server-Timing headers and a slow-request log."
+import json
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('config.slow_requests')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    # Statements that differ only in literal values or IN list length
+    # collapse to the same shape, which is what makes N+1 loops stand out.
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryStats:
+    # A connection.execute_wrapper() that records every statement run while
+    # it is installed.
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.shapes = Counter()
+        self.shape_durations = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            shape = normalize_sql(sql)
+            self.count += 1
+            self.duration += duration
+            self.shapes[shape] += 1
+            self.shape_durations[shape] += duration
+            try:
+                self.statements[(sql, repr(params))] += 1
+            except TypeError:
+                pass
+
+    @property
+    def duplicates(self):
+        # Executions of a statement with exactly the same parameters beyond
+        # the first one.
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def top_statement(self):
+        if not self.shapes:
+            return None, 0, 0.0
+        shape, count = max(
+            self.shapes.items(), key=lambda item: (item[1], self.shape_durations[item[0]]),
+        )
+        return shape, count, self.shape_durations[shape]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Counts the queries, total SQL time and duplicate statements of every
+    request, reports them in a Server-Timing header and logs requests slower
+    than SLOW_REQUEST_THRESHOLD_MS together with their most repeated SQL.
+
+    Enabled by SQL_INSTRUMENTATION; when it is off Django drops the
+    middleware from the chain, so it costs nothing per request.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500) / 1000
+
+    def __call__(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        # Streaming bodies are produced after this point, so their queries
+        # are not included.
+        duration = time.perf_counter() - started
+
+        response['Server-Timing'] = ', '.join([
+            f'sql;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"',
+            f'sql-dup;desc="{stats.duplicates} duplicates"',
+            f'app;dur={duration * 1000:.2f}',
+        ])
+        if duration >= self.slow_threshold:
+            self.log_slow_request(request, response, duration, stats)
+        return response
+
+    def log_slow_request(self, request, response, duration, stats):
+        top_sql, top_count, top_duration = stats.top_statement()
+        logger.warning('slow request %s', json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': stats.count,
+            'sql_ms': round(stats.duration * 1000, 2),
+            'duplicates': stats.duplicates,
+            'top_sql': top_sql,
+            'top_sql_count': top_count,
+            'top_sql_ms': round(top_duration * 1000, 2),
+        }))
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -158,10 +159,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ]
+        'authentication.authentication.CachedJWTAuthentication',
+    ],
+    # Login attempts (authentication.throttling), checked before the
+    # password hash is computed.
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('LOGIN_IP_THROTTLE_RATE', default='20/min'),
+        'login_account': config('LOGIN_ACCOUNT_THROTTLE_RATE', default='5/min'),
+        'confirmation_resend': config('CONFIRMATION_RESEND_THROTTLE_RATE', default='3/hour'),
+    },
+    # Reverse proxies in front of the app. Throttles key clients on the
+    # address the last of them saw; with 0 they use REMOTE_ADDR and ignore
+    # the client-supplied X-Forwarded-For.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
+# Cache alias holding the login throttle windows and metrics.
+LOGIN_THROTTLE_CACHE = 'shared'
+
+# Seconds a JWT-authenticated user stays cached between saves.
+AUTH_USER_CACHE_TIMEOUT = 60
+# Cache alias holding the per-user versions that invalidate those entries,
+# read on every authenticated request so changes apply on all workers at once.
+AUTH_USER_VERSION_CACHE = 'shared'
+
+# In-process Bloom filter over the refresh token blacklist
+# (authentication.blacklist), kept in sync through a stamp in this cache that
+# each worker reads at most once per TOKEN_BLACKLIST_SYNC_INTERVAL seconds.
+TOKEN_BLACKLIST_CACHE = 'shared'
+TOKEN_BLACKLIST_SYNC_INTERVAL = 5
+TOKEN_BLACKLIST_FILTER_CAPACITY = 100000
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = 0.001
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=30),
@@ -188,20 +217,53 @@ SWAGGER_SETTINGS = {
 
 
 # Email settings
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = config("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
+EMAIL_TIMEOUT = 30
+
+# Registration confirmation codes stop working after this long and are
+# deleted by purge_confirmation_codes.
+CONFIRMATION_CODE_LIFETIME = timedelta(hours=24)
+
+# Registration mail is queued in OutgoingEmail and sent by the
+# send_queued_emails worker.
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_DELAY = 30
+# A worker leases its batch for this long while sending outside the
+# transaction; messages of a worker that dies are retried after it.
+EMAIL_QUEUE_LEASE = EMAIL_TIMEOUT * 20
 
 
 # cash settings
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
-        'LOCATION': 'my_cache_table',
+        'BACKEND': 'config.cache.TieredCache',
+        'LOCATION': 'shared',
         'TIMEOUT': 3600,
-    }
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': config('LOCAL_CACHE_MAX_ENTRIES', default=2000, cast=int),
+            'LOCAL_TIMEOUT': config('LOCAL_CACHE_TIMEOUT', default=5, cast=float),
+        },
+    },
+    'shared': {
+        'BACKEND': config(
+            'SHARED_CACHE_BACKEND',
+            default='django.core.cache.backends.db.DatabaseCache',
+        ),
+        'LOCATION': config('SHARED_CACHE_LOCATION', default='my_cache_table'),
+        'TIMEOUT': 3600,
+    },
 }
+
+BOOK_RESPONSE_CACHE_TIMEOUT = 300
+
+
+# SQL instrumentation (config.middleware): Server-Timing headers on every
+# response and a log line for requests slower than the threshold.
+SQL_INSTRUMENTATION = config('SQL_INSTRUMENTATION', default=False, cast=bool)
+SLOW_REQUEST_THRESHOLD_MS = config('SLOW_REQUEST_THRESHOLD_MS', default=500, cast=int)
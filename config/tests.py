@@ -0,0 +1,196 @@
+import json
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from config.cache import TieredCache
+from config.middleware import QueryInstrumentationMiddleware, normalize_sql
+
+# Two workers: each TieredCache keeps its own local tier, keyed by the shared
+# alias, and both shared aliases point at the same LocMem store.
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'worker-1-shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-cache-tests',
+    },
+    'worker-2-shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-cache-tests',
+    },
+}
+LOCAL_TIMEOUT = 5
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('config.cache.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.first = self.create_cache('worker-1-shared')
+        self.second = self.create_cache('worker-2-shared')
+        self.first.clear()
+        self.second.clear()
+
+    def create_cache(self, alias, max_entries=100):
+        cache = TieredCache(alias, {
+            'OPTIONS': {'LOCAL_MAX_ENTRIES': max_entries, 'LOCAL_TIMEOUT': LOCAL_TIMEOUT},
+        })
+        cache._stats.update(dict.fromkeys(cache._stats, 0))
+        return cache
+
+    def advance(self, seconds=LOCAL_TIMEOUT):
+        self.now += seconds
+
+    def test_set_reaches_other_worker_after_local_timeout(self):
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+
+        self.first.set('key', 'new')
+        self.assertEqual(self.first.get('key'), 'new')
+        # The second worker trusts its copy until LOCAL_TIMEOUT has passed.
+        self.advance(LOCAL_TIMEOUT - 1)
+        self.assertEqual(self.second.get('key'), 'old')
+        self.advance(1)
+        self.assertEqual(self.second.get('key'), 'new')
+        self.assertEqual(self.second.get_many(['key', 'missing']), {'key': 'new'})
+
+    def test_unchanged_entry_is_revalidated_by_stamp(self):
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.advance()
+        with mock.patch.object(caches['worker-2-shared'], 'get_many') as get_many:
+            self.assertEqual(self.second.get('key'), 'value')
+        get_many.assert_not_called()
+        self.assertEqual(self.second.stats()['revalidations'], 1)
+
+    def test_delete_propagates(self):
+        self.first.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.second.get_many(['a', 'b']), {'a': 1, 'b': 2})
+
+        self.first.delete('a')
+        self.first.delete_many(['b'])
+        self.assertIsNone(self.first.get('a'))
+        self.assertEqual(self.second.get('a'), 1)
+        self.advance()
+        self.assertIsNone(self.second.get('a'))
+        self.assertEqual(self.second.get_many(['a', 'b']), {})
+
+    def test_incr_propagates(self):
+        self.first.set('counter', 1)
+        self.assertEqual(self.second.get('counter'), 1)
+
+        self.assertEqual(self.first.incr('counter'), 2)
+        self.assertEqual(self.first.get('counter'), 2)
+        self.assertEqual(self.second.get('counter'), 1)
+        self.advance()
+        self.assertEqual(self.second.get('counter'), 2)
+        self.assertEqual(self.second.incr('counter', 5), 7)
+        self.advance()
+        self.assertEqual(self.first.get('counter'), 7)
+
+    def test_add_does_not_overwrite(self):
+        self.assertTrue(self.first.add('key', 'first'))
+        self.assertFalse(self.second.add('key', 'second'))
+        self.assertEqual(self.second.get('key'), 'first')
+
+    def test_stats(self):
+        cache = self.create_cache('worker-1-shared', max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('missing'))
+        self.advance()
+        self.assertEqual(cache.get('a'), 1)
+
+        self.assertEqual(cache.stats(), {
+            'hits': 2,
+            'misses': 2,
+            'revalidations': 1,
+            'evictions': 2,
+            'entries': 2,
+            'max_entries': 2,
+        })
+
+
+def run_queries(request):
+    with connection.cursor() as cursor:
+        for book_id in (1, 1, 2):
+            cursor.execute('SELECT id FROM book_book WHERE id = %s', [book_id])
+        cursor.execute('SELECT COUNT(*) FROM book_genre')
+    return HttpResponse('ok')
+
+
+@override_settings(SQL_INSTRUMENTATION=True, SLOW_REQUEST_THRESHOLD_MS=60000)
+class QueryInstrumentationTests(TestCase):
+
+    def get(self, path='/books/'):
+        return QueryInstrumentationMiddleware(run_queries)(RequestFactory().get(path))
+
+    def test_server_timing(self):
+        with self.assertNoLogs('config.slow_requests'):
+            response = self.get()
+        sql, duplicates, app = response['Server-Timing'].split(', ')
+        self.assertRegex(sql, r'^sql;dur=\d+\.\d{2};desc="4 queries"$')
+        # The second lookup of book 1; book 2 has other parameters.
+        self.assertEqual(duplicates, 'sql-dup;desc="1 duplicates"')
+        self.assertRegex(app, r'^app;dur=\d+\.\d{2}$')
+
+    def test_through_the_middleware_chain(self):
+        response = Client().get(reverse('book-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('queries"', response['Server-Timing'])
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_request_log(self):
+        with self.assertLogs('config.slow_requests', 'WARNING') as logs:
+            self.get('/slow/')
+        message, = logs.records
+        self.assertTrue(message.getMessage().startswith('slow request '))
+        data = json.loads(message.getMessage()[len('slow request '):])
+        self.assertEqual(
+            {key: data[key] for key in ('method', 'path', 'status', 'queries', 'duplicates')},
+            {'method': 'GET', 'path': '/slow/', 'status': 200, 'queries': 4, 'duplicates': 1},
+        )
+        self.assertEqual(data['top_sql'], 'SELECT id FROM book_book WHERE id = ?')
+        self.assertEqual(data['top_sql_count'], 3)
+
+    @override_settings(SQL_INSTRUMENTATION=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryInstrumentationMiddleware(run_queries)
+        self.assertNotIn('Server-Timing', Client().get(reverse('book-list')))
+
+
+class NormalizeSQLTests(SimpleTestCase):
+
+    def test_literals(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t1 WHERE name = 'O''Brien' AND rating > 4.5 AND id = %s"),
+            'SELECT * FROM t1 WHERE name = ? AND rating > ? AND id = ?',
+        )
+
+    def test_in_lists(self):
+        for sql in (
+            'SELECT id FROM book WHERE id IN (%s, %s, %s)',
+            'SELECT id FROM book WHERE id IN (1,2)',
+            'SELECT id FROM book WHERE id in (%s)',
+        ):
+            with self.subTest(sql=sql):
+                self.assertEqual(normalize_sql(sql), 'SELECT id FROM book WHERE id IN (...)')
+
+    def test_whitespace(self):
+        self.assertEqual(normalize_sql('SELECT  id\n  FROM book\tWHERE id = 7 '), 'SELECT id FROM book WHERE id = ?')